@@ -1,3 +1,6 @@
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -6,22 +9,42 @@ import os
 import re
 import json
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+import asyncio
 import zipfile
 import os
 import uuid
 import shutil
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
+# Heavy modules (torch, transformers, LangChain, Supabase) are imported on
+# first use so the server accepts connections before the model is ready
+from src.image_analysis.model_registry import model_registry
+from src.image_analysis.inference_pool import inference_pool
+from src.pipeline.jobs import job_manager
+from src.pipeline.priority_index import priority_index, PRIORITY_PAGE_SIZE, PRIORITY_MAX_PAGE_SIZE
+from src.pipeline.result_store import result_store, RESULT_STORE_ENABLED, RESULT_QUERY_LIMIT
+from utils.metrics import registry as metrics_registry
 
-from src.tools.image_analysis_tool import run_full_damage_analysis
-from src.tools.web_search_tool import search_web
+# Start loading SegFormer right after startup instead of on the first request
+SEGFORMER_PRELOAD = os.getenv("SEGFORMER_PRELOAD", "true").strip().lower() in ("1", "true", "yes", "on")
 
-from main import analyze_damage
-from utils.utils import download_supabase_images
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SEGFORMER_PRELOAD:
+        # With a worker pool the model lives in the workers; this process loads it only for tiled images
+        if inference_pool:
+            inference_pool.start()
+        else:
+            model_registry.load_in_background()
+    yield
+    job_manager.shutdown()
+    if inference_pool:
+        inference_pool.shutdown(wait=False)
+    rendering = sys.modules.get("src.image_analysis.rendering")
+    if rendering is not None:
+        rendering.renderer.shutdown(wait=False)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,15 +58,112 @@ class FolderData(BaseModel):
     folder_path: str
     user_id: str 
 
-@app.post("/folder-path")
-async def analyze_damage_endpoint(data: FolderData):
+def run_analysis_job(data: FolderData, progress):
+    from main import analyze_damage
+    from utils.utils import stream_supabase_images
 
-    image_path = download_supabase_images(data.folder_path)
+    progress("stage", stage="download")
+    # Segmentation consumes files as they finish downloading
+    image_folder, image_paths = stream_supabase_images(data.folder_path)
 
-    analysis = analyze_damage(image_path)
+    keep_masks = RESULT_STORE_ENABLED and result_store.keep_masks
+    analysis = analyze_damage(image_folder, progress=progress, image_paths=image_paths, keep_masks=keep_masks)
     analysis["evaluator_decision"]["image_name"] = analysis["evaluator_decision"]["image_path"].split("/")[-1]
 
+    # Only this folder's rows change; earlier folders keep their ranking
+    progress("stage", stage="indexing")
+    priority_index.update(data.user_id, data.folder_path, analysis["detailed_analysis"], analysis["evaluator_decision"])
+    if RESULT_STORE_ENABLED:
+        result_store.append(data.user_id, data.folder_path, analysis["detailed_analysis"], analysis["evaluator_decision"])
+
     return {
         "message": analysis["evaluator_decision"]
     }
 
+@app.post("/folder-path")
+async def analyze_damage_endpoint(data: FolderData):
+    # The analysis blocks on downloads, torch and LLM calls, so it runs on the job pool
+    job = job_manager.submit(run_analysis_job, data)
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def job_status_endpoint(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        cursor = 0
+        while True:
+            events = job.events_since(cursor)
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            cursor += len(events)
+            if job.finished and cursor >= len(job.events):
+                yield f"event: done\ndata: {json.dumps(job.snapshot())}\n\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+# Priority and result queries read from disk (SQLite, result segments), so they run on the
+# threadpool rather than the event loop
+@app.get("/priority/top")
+def priority_top_endpoint(user_id: str = None, k: int = 10):
+    if k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1")
+    return {"user_id": user_id, "items": priority_index.top(user_id, k=min(k, PRIORITY_MAX_PAGE_SIZE))}
+
+@app.get("/priority")
+def priority_page_endpoint(user_id: str = None, page: int = 1, page_size: int = PRIORITY_PAGE_SIZE):
+    return priority_index.page(user_id, page=page, page_size=page_size)
+
+@app.get("/results")
+def results_endpoint(event: str = None, user_id: str = None, min_score: float = None, max_score: float = None,
+                     since: str = None, until: str = None, latest: bool = True, limit: int = 100):
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    try:
+        items = result_store.records(
+            limit=min(limit, RESULT_QUERY_LIMIT), event=event, user_id=user_id, min_score=min_score,
+            max_score=max_score, since=since, until=until, latest=latest,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"count": len(items), "items": items}
+
+@app.get("/results/summary")
+def results_summary_endpoint(group_by: str = "event", user_id: str = None, since: str = None, until: str = None):
+    try:
+        return {"group_by": group_by, "groups": result_store.summary(group_by, user_id=user_id, since=since, until=until)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/health")
+async def health_endpoint():
+    # Liveness: the process is up and serving
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness_endpoint():
+    statuses = [inference_pool.status if inference_pool else model_registry.status]
+    if SEGFORMER_PRELOAD:
+        ready = all(status == "ready" for status in statuses)
+    else:
+        ready = "failed" not in statuses
+    body = {"ready": ready, "model": model_registry.stats(), "error": model_registry.load_error}
+    if inference_pool:
+        body["inference_pool"] = inference_pool.stats()
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
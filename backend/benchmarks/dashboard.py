@@ -0,0 +1,77 @@
+# benchmarks/dashboard.py
+"""
+Benchmark of dashboard generation on synthetic results.
+
+Builds a dashboard from `--rows` results, then appends `--append` more to
+it, and reports the generation time and HTML size of both steps:
+
+    python -m benchmarks.dashboard --rows 10000 --append 500
+    python -m benchmarks.dashboard --rows 10000 --located 0   # results without coordinates
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+
+def synthetic_results(count, located=1.0, seed=0, offset=0):
+    """Results shaped like the pipeline output; a `located` fraction carries coordinates."""
+    rng = np.random.default_rng(seed)
+    lat = 30.0 + rng.normal(0, 0.3, count)
+    lon = -85.0 + rng.normal(0, 0.3, count)
+    has_coordinates = rng.random(count) < located
+    results = []
+    for i in range(count):
+        item = {
+            "image_path": f"downloaded/sweep/synthetic-event_{offset + i:06d}.png",
+            "damage_score": int(rng.integers(0, 11)),
+            "damage_explanation": "Synthetic explanation with <b>markup</b> & symbols. " * 4,
+        }
+        if has_coordinates[i]:
+            item["latitude"], item["longitude"] = float(lat[i]), float(lon[i])
+        results.append(item)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="Results in the initial dashboard")
+    parser.add_argument("--append", type=int, default=500, help="Results appended afterwards")
+    parser.add_argument("--located", type=float, default=1.0, help="Fraction of results with latitude/longitude")
+    parser.add_argument("--plotlyjs", choices=("cdn", "directory"), default="cdn", help="How plotly.js is included")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    from benchmarks.pipeline import git_revision
+    from src.tools.dashboard_tool import build_dashboard
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "dashboard.html")
+        initial = build_dashboard(synthetic_results(args.rows, args.located), path, include_plotlyjs=args.plotlyjs)
+        appended = build_dashboard(
+            synthetic_results(args.append, args.located, seed=1, offset=args.rows), path, append=True,
+            include_plotlyjs=args.plotlyjs,
+        )
+
+    report = {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "initial": {k: v for k, v in initial.items() if k != "path"},
+        "append": {k: v for k, v in appended.items() if k != "path"},
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,187 @@
+# benchmarks/fakes.py
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+class FakeRateLimitError(Exception):
+    """Mimics a provider 429 response."""
+
+    def __init__(self, message="429 Resource has been exhausted"):
+        super().__init__(message)
+        self.status_code = 429
+
+
+class FakeDamageChatModel:
+    """
+    Local stand-in for the structured-output Gemini model.
+
+    `invoke` sleeps for `latency` seconds to simulate the network round-trip and
+    returns a DamageAnalysisResult-shaped object. A fraction of calls can be made
+    to fail with a 429 to exercise the retry path. Callbacks passed in `config`
+    see the start and end of each call, as with a real chat model. The image
+    bytes of the last request are kept in `last_image_url`.
+    """
+
+    def __init__(self, latency: float = 0.5, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.last_image_url = None
+
+    def invoke(self, messages, config=None):
+        from src.image_analysis.mask_analysis import DamageAnalysisResult
+
+        callbacks = (config or {}).get("callbacks") or []
+        run_id = uuid.uuid4()
+        for callback in callbacks:
+            callback.on_chat_model_start({}, [messages], run_id=run_id)
+        for part in messages[-1].content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                self.last_image_url = part["image_url"]["url"]
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            fail = self._random.random() < self.failure_rate
+            score = self._random.randint(0, 10)
+        try:
+            time.sleep(self.latency)
+            if fail:
+                with self._lock:
+                    self.failures += 1
+                raise FakeRateLimitError()
+            for callback in callbacks:
+                callback.on_llm_end(SimpleNamespace(generations=[]), run_id=run_id)
+            return DamageAnalysisResult(
+                damage_explanation="Synthetic explanation from the fake model.",
+                damage_score=score,
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+class LocalFolderStorage:
+    """
+    Storage backend serving files from a local directory, with the same
+    `list`/`stream` interface as utils.download_manager.SupabaseStorage.
+    """
+
+    def __init__(self, root: str, latency: float = 0.0, chunk_size: int = 1 << 16):
+        self.root = root
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.streamed = 0
+
+    def list(self, folder_path: str) -> list:
+        folder = os.path.join(self.root, folder_path)
+        entries = []
+        for name in sorted(os.listdir(folder)):
+            stat = os.stat(os.path.join(folder, name))
+            entries.append({"name": name, "size": stat.st_size, "etag": f"{stat.st_size:x}-{int(stat.st_mtime_ns):x}"})
+        return entries
+
+    def stream(self, object_path: str):
+        time.sleep(self.latency)
+        self.streamed += 1
+        with open(os.path.join(self.root, object_path), "rb") as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                yield chunk
+
+
+class FakeTextChatModel:
+    """
+    Stand-in for the ChatGoogleGenerativeAI model used by main.py.
+
+    Plain `invoke` answers area-inference questions; `with_structured_output`
+    returns a model that fills in the requested schema from the prompt.
+    """
+
+    model = "fake-text-model"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _record_call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def invoke(self, messages, config=None):
+        self._record_call()
+        return SimpleNamespace(content="Synthetic Area")
+
+    def with_structured_output(self, schema):
+        parent = self
+
+        class _Structured:
+            def invoke(self, messages, config=None):
+                parent._record_call()
+                prompt = messages[-1].content
+                ids = re.findall(r'"id":\s*(\d+)', prompt)
+                paths = re.findall(r'"image_path":\s*"([^"]+)"', prompt)
+                values = {
+                    "candidate_id": int(ids[0]) if ids else 0,
+                    "area_name": "Synthetic Area",
+                    "damage_score": 5.0,
+                    "original_explanation": "Synthetic explanation from the fake model.",
+                    "justification": "Chosen by the fake evaluator.",
+                    "image_path": paths[0] if paths else "",
+                }
+                return schema(**{name: values[name] for name in schema.model_fields})
+
+        return _Structured()
+
+
+class FakeSearchTool:
+    """Stand-in for the search_web tool."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, params):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"Synthetic search results for {params['query']}."
+
+
+def tiny_segmentation_model():
+    """Randomly initialised SegFormer with the ADE20K label count; no download needed."""
+    import torch
+    from transformers import SegformerConfig, SegformerFeatureExtractor, SegformerForSemanticSegmentation
+
+    # Same weights in every process, so inference workers agree with the API process
+    torch.manual_seed(0)
+
+    config = SegformerConfig(
+        num_labels=150,
+        hidden_sizes=[16, 32, 64, 128],
+        decoder_hidden_size=64,
+        depths=[1, 1, 1, 1],
+        num_attention_heads=[1, 2, 2, 4],
+    )
+    extractor = SegformerFeatureExtractor(size={"height": 256, "width": 256})
+    return SegformerForSemanticSegmentation(config), extractor
+
+
+def tiny_onnx_segmentation_model():
+    """The tiny model above, exported to ONNX and run with ONNX Runtime."""
+    import tempfile
+    from src.image_analysis.onnx_backend import OnnxSegformer
+
+    model, extractor = tiny_segmentation_model()
+    path = os.path.join(tempfile.gettempdir(), f"tiny-segformer-{os.getpid()}.onnx")
+    return OnnxSegformer.from_torch(model, extractor, path), extractor
@@ -0,0 +1,176 @@
+# benchmarks/inference_pool.py
+"""
+Throughput of SegFormer inference for concurrent clients, in the API process
+versus the multi-process inference pool.
+
+Each of `--clients` threads submits `--requests` chunks of `--chunk`
+preprocessed images, like analysis jobs of different users. The in-process
+run calls the shared model from every thread; the pool runs are repeated for
+each worker count in `--workers` and check that their masks match. A last
+pool whose workers cannot load the model checks that callers submitting
+while it fails all get an InferenceError instead of waiting forever; the
+run exits non-zero when a check fails:
+
+    python -m benchmarks.inference_pool --clients 4 --chunk 4 --workers 1,2,4
+    python -m benchmarks.inference_pool --model segformer   # real checkpoint instead of the tiny random one
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+
+FACTORIES = {
+    "tiny": "benchmarks.fakes:tiny_segmentation_model",
+    "segformer": "src.image_analysis.segmentation_model:segmentation_model",
+}
+# Workers fail to import this, like a missing checkpoint
+MISSING_FACTORY = "benchmarks.fakes:missing_segmentation_model"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=tuple(FACTORIES), default="tiny", help="Model every worker loads")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent callers")
+    parser.add_argument("--requests", type=int, default=8, help="Chunks submitted by each caller")
+    parser.add_argument("--chunk", type=int, default=4, help="Images per chunk")
+    parser.add_argument("--workers", default="1,2", help="Comma-separated worker counts to try")
+    parser.add_argument("--max-batch", type=int, default=16, help="Images per forward pass in the pool")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def run_clients(infer, chunks, clients: int) -> tuple:
+    """Runs every client's chunks concurrently; returns (seconds, masks in chunk order)."""
+    per_client = [chunks[i::clients] for i in range(clients)]
+
+    def client(own_chunks):
+        return [infer(chunk) for chunk in own_chunks]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(client, per_client))
+    seconds = time.perf_counter() - start
+
+    masks = [None] * len(chunks)
+    for i, client_masks in enumerate(results):
+        masks[i::clients] = client_masks
+    return seconds, masks
+
+
+def check_failed_load(chunk, clients: int, timeout: float = 60.0) -> dict:
+    """
+    Submits from `clients` threads for as long as a pool that cannot load its
+    model keeps accepting work; every request must be refused or failed.
+    """
+    from src.image_analysis.inference_pool import InferenceError, InferencePool
+
+    pool = InferencePool(workers=2, model_factory=MISSING_FACTORY).start()
+
+    def client(_):
+        futures, refused = [], 0
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                futures.append(pool.submit(chunk))
+            except InferenceError:
+                refused += 1
+                break
+        outcomes = {"refused": refused, "failed": 0, "hung": 0}
+        for future in futures:
+            try:
+                future.result(timeout=max(0.1, deadline - time.monotonic()))
+            except InferenceError:
+                outcomes["failed"] += 1
+            except TimeoutError:
+                outcomes["hung"] += 1
+        return outcomes
+
+    try:
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(client, range(clients)))
+    finally:
+        pool.shutdown()
+    return {key: sum(result[key] for result in results) for key in ("refused", "failed", "hung")}
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    import torch
+    from benchmarks.pipeline import git_revision
+    from src.image_analysis.inference_pool import InferencePool, _load_factory
+
+    model, extractor = _load_factory(FACTORIES[args.model])()
+    model.eval()
+    size = extractor.size
+    rng = np.random.default_rng(0)
+    chunks = [
+        rng.standard_normal((args.chunk, 3, size["height"], size["width"]), dtype=np.float32)
+        for _ in range(args.clients * args.requests)
+    ]
+    images = len(chunks) * args.chunk
+
+    def infer_in_process(pixel_values):
+        with torch.inference_mode():
+            logits = model(pixel_values=torch.from_numpy(pixel_values)).logits
+            return torch.argmax(logits, dim=1).to(torch.uint8).numpy()
+
+    infer_in_process(chunks[0])
+    seconds, expected = run_clients(infer_in_process, chunks, args.clients)
+    runs = {"in_process": {
+        "seconds": round(seconds, 3), "images_per_second": round(images / seconds, 2),
+        "torch_threads": torch.get_num_threads(),
+    }}
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        pool = InferencePool(workers=workers, max_batch=args.max_batch, model_factory=FACTORIES[args.model]).start()
+        try:
+            start = time.perf_counter()
+            for _ in range(workers):
+                pool.infer(chunks[0][:1])  # waits for the models to load
+            load_seconds = time.perf_counter() - start
+            pool.batches = pool.images = 0
+
+            seconds, masks = run_clients(pool.infer, chunks, args.clients)
+            stats = pool.stats()
+        finally:
+            pool.shutdown()
+        runs[f"pool_{workers}"] = {
+            "seconds": round(seconds, 3),
+            "images_per_second": round(images / seconds, 2),
+            "speedup": round(runs["in_process"]["seconds"] / seconds, 2),
+            "load_seconds": round(load_seconds, 3),
+            "threads_per_worker": stats["threads_per_worker"],
+            "pinned": stats["pinned"],
+            "mean_batch": stats["mean_batch"],
+            "masks_match": all(np.array_equal(a, b) for a, b in zip(masks, expected)),
+        }
+
+    failures = [f"{name}: masks differ from the in-process run" for name, run in runs.items()
+                if not run.get("masks_match", True)]
+    failed_load = check_failed_load(chunks[0][:1], args.clients)
+    if failed_load["hung"] or failed_load["refused"] != args.clients:
+        failures.append(f"callers of a pool that failed to load were left waiting: {failed_load}")
+
+    report = {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "images": images,
+        "runs": runs,
+        "failed_load": failed_load,
+        "failures": failures,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,106 @@
+# benchmarks/large_images.py
+"""
+Benchmark and checks for opening images above Pillow's pixel limit.
+
+Writes a synthetic scene, lowers Pillow's decompression-bomb limit far below
+its size (as if it were a 15k x 15k satellite scene under the default limit)
+and checks that it is still routed to tiling, decoded into a memory-mapped
+array and downscaled for the LLM, while Pillow's global limit is left as it
+was. Reports the decode time and peak RSS growth; exits non-zero when a
+check fails:
+
+    python -m benchmarks.large_images
+    python -m benchmarks.large_images --side 6000 --format jpeg
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--side", type=int, default=3000, help="Width and height of the synthetic scene")
+    parser.add_argument("--format", choices=("png", "jpeg", "bmp"), default="png", help="File format of the scene")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    from PIL import Image
+
+    from benchmarks.pipeline import git_revision
+    from src.image_analysis.llm_image import load_for_llm
+    from src.image_analysis.tiling import open_pixels, should_tile
+    from utils.memory import peak_rss_mb
+
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, f"scene.{args.format}")
+        rng = np.random.default_rng(0)
+        coarse = rng.integers(0, 255, (args.side // 100 + 1, args.side // 100 + 1, 3), dtype=np.uint8)
+        pixels = np.kron(coarse, np.ones((100, 100, 1), dtype=np.uint8))[:args.side, :args.side]
+        Image.fromarray(pixels).save(path)
+        del coarse
+
+        # Opening the scene with Image.open would now raise DecompressionBombError
+        previous_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = args.side * args.side // 4
+        try:
+            try:
+                Image.open(path).close()
+                failures.append("the synthetic scene does not exceed Pillow's lowered limit")
+            except Image.DecompressionBombError:
+                pass
+
+            tiled = should_tile(path, "auto")
+            if not tiled:
+                failures.append("should_tile did not route the over-limit scene to tiling")
+
+            rss_before = peak_rss_mb()
+            start = time.perf_counter()
+            decoded = open_pixels(path, scratch_dir=root)
+            decode_seconds = time.perf_counter() - start
+            if decoded.shape != (args.side, args.side, 3) or not np.array_equal(decoded[::97, ::89], pixels[::97, ::89]):
+                if args.format != "jpeg":  # lossy, only the shape can be compared
+                    failures.append("open_pixels returned different pixels")
+                elif decoded.shape != (args.side, args.side, 3):
+                    failures.append("open_pixels returned the wrong shape")
+            decode_rss_growth = peak_rss_mb() - rss_before
+            del decoded
+
+            llm_image = load_for_llm(path)
+            if max(llm_image["width"], llm_image["height"]) > 1024:
+                failures.append("load_for_llm did not downscale the scene")
+
+            if Image.MAX_IMAGE_PIXELS != args.side * args.side // 4:
+                failures.append("Pillow's global pixel limit was changed")
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous_limit
+
+    report = {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "routed_to_tiling": tiled,
+        "decode_seconds": round(decode_seconds, 3),
+        "decode_peak_rss_growth_mb": round(decode_rss_growth, 1),
+        "llm_image": {key: llm_image[key] for key in ("mime_type", "width", "height")},
+        "failures": failures,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
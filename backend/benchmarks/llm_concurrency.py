@@ -0,0 +1,79 @@
+# benchmarks/llm_concurrency.py
+"""
+Compares sequential `analyze_image` calls with the pipeline's scoring stage
+(a shared `DamageScorer` on `--concurrency` worker threads) against a local
+fake chat model, without network access.
+
+    python -m benchmarks.llm_concurrency --images 32 --latency 0.5 --concurrency 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key-for-benchmarks")
+
+from benchmarks.fakes import FakeDamageChatModel
+from src.image_analysis.mask_analysis import DamageScorer, analyze_image
+from src.pipeline.stages import StagedPipeline
+
+
+def make_images(folder, count, size=64):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"synthetic-event_{i:04d}.png")
+        Image.fromarray(np.random.randint(0, 255, (size, size, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per LLM call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=6000, help="Requests per minute for the token bucket")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls that return a 429")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_images(folder, args.images)
+
+        sequential_model = FakeDamageChatModel(latency=args.latency)
+        start = time.perf_counter()
+        sequential = [analyze_image(p, model=sequential_model, use_cache=False) for p in paths]
+        sequential_seconds = time.perf_counter() - start
+
+        concurrent_model = FakeDamageChatModel(latency=args.latency, failure_rate=args.failure_rate)
+        start = time.perf_counter()
+        scorer = DamageScorer(
+            max_concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            model=concurrent_model,
+            use_cache=False,
+        )
+        # The scoring stage of full_damage_analysis, fed straight from the image paths
+        pipeline = StagedPipeline(paths).add_stage(
+            "scoring", lambda path: [scorer.score(path)], workers=args.concurrency
+        )
+        concurrent = list(pipeline)
+        concurrent_seconds = time.perf_counter() - start
+
+    assert len(sequential) == len(concurrent) == len(paths)
+    print(json.dumps({
+        "images": args.images,
+        "sequential_seconds": round(sequential_seconds, 3),
+        "concurrent_seconds": round(concurrent_seconds, 3),
+        "speedup": round(sequential_seconds / concurrent_seconds, 2),
+        "max_in_flight": concurrent_model.max_in_flight,
+        "llm_calls": concurrent_model.calls,
+        "retried_failures": concurrent_model.failures,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
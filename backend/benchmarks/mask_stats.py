@@ -0,0 +1,119 @@
+# benchmarks/mask_stats.py
+"""
+Benchmark of the building component labeler on worst-case masks.
+
+Times `component_sizes` on shapes that defeat neighbour-propagation labelers
+(one long snake, a comb, a spiral, a checkerboard) next to a solid block and
+random noise, checks the component counts, and exits non-zero when any mask
+takes longer than `--max-ms`:
+
+    python -m benchmarks.mask_stats
+    python -m benchmarks.mask_stats --sides 160 512 1024 --max-ms 250
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+
+def snake(side):
+    """Every other row filled, joined alternately at the right and left edges: a single path side²/2 pixels long."""
+    mask = np.zeros((side, side), dtype=bool)
+    mask[::2] = True
+    for i, row in enumerate(range(1, side, 2)):
+        mask[row, side - 1 if i % 2 == 0 else 0] = True
+    return mask
+
+
+def comb(side):
+    """Every other column filled, all hanging off the first row."""
+    mask = np.zeros((side, side), dtype=bool)
+    mask[:, ::2] = True
+    mask[0] = True
+    return mask
+
+
+def spiral(side):
+    """A one-pixel wall spiralling inwards with a one-pixel gap."""
+    mask = np.zeros((side, side), dtype=bool)
+    top, left, bottom, right = 0, 0, side - 1, side - 1
+    while top <= bottom and left <= right:
+        mask[top, left:right + 1] = True
+        mask[top:bottom + 1, right] = True
+        mask[bottom, left:right + 1] = True
+        mask[top + 2:bottom + 1, left] = True
+        if top + 2 <= bottom:
+            mask[top + 2, left:right - 1] = True
+        top, left, bottom, right = top + 2, left + 2, bottom - 2, right - 2
+    return mask
+
+
+def checkerboard(side):
+    """No two foreground pixels are 4-connected: side²/2 components."""
+    return np.indices((side, side)).sum(axis=0) % 2 == 0
+
+
+# name -> (mask builder, expected component count or None)
+MASKS = {
+    "solid": (lambda side: np.ones((side, side), dtype=bool), lambda side: 1),
+    "snake": (snake, lambda side: 1),
+    "comb": (comb, lambda side: 1),
+    "spiral": (spiral, lambda side: 1),
+    "checkerboard": (checkerboard, lambda side: side * side // 2),
+    "random": (lambda side: np.random.default_rng(0).random((side, side)) < 0.6, lambda side: None),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sides", type=int, nargs="+", default=[160, 512], help="Mask side lengths")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per mask; the fastest is reported")
+    parser.add_argument("--max-ms", type=float, default=100.0, help="Fail when any mask takes longer than this")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    from benchmarks.pipeline import git_revision
+    from src.image_analysis.mask_stats import component_sizes
+
+    timings, failures = {}, []
+    for side in args.sides:
+        for name, (build, expected_count) in MASKS.items():
+            mask = build(side)
+            best = float("inf")
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                sizes = component_sizes(mask)
+                best = min(best, time.perf_counter() - start)
+            ms = round(best * 1000, 2)
+            expected = expected_count(side)
+            timings[f"{name}_{side}"] = {"components": int(sizes.size), "ms": ms}
+            if expected is not None and sizes.size != expected:
+                failures.append(f"{name}_{side}: {sizes.size} components, expected {expected}")
+            if int(sizes.sum()) != int(mask.sum()):
+                failures.append(f"{name}_{side}: component sizes do not add up to the mask")
+            if ms > args.max_ms:
+                failures.append(f"{name}_{side}: {ms}ms exceeds {args.max_ms}ms")
+
+    report = {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "timings": timings,
+        "failures": failures,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
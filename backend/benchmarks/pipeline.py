@@ -0,0 +1,191 @@
+# benchmarks/pipeline.py
+"""
+End-to-end benchmark of the analysis pipeline on a synthetic image folder.
+
+LLM, web search and storage are replaced with local fakes, so the numbers
+reflect our own code (download manager, segmentation, scoring fan-out, area
+lookup and evaluation) rather than network latency. Results are printed as
+JSON and can be written to a file to compare commits:
+
+    python -m benchmarks.pipeline --images 64 --resolution 512 --output bench.json
+    python -m benchmarks.pipeline --model segformer   # real checkpoint instead of the tiny random one
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def make_synthetic_folder(folder, count, resolution, events=4, seed=0, duplicates=0.0):
+    """
+    Writes `count` smooth random images named like '<event>_<index>.png'.
+    A `duplicates` fraction of them are slightly noisy copies of earlier
+    images, like consecutive frames of a drone sweep.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    previous = None
+    for i in range(count):
+        if previous is not None and rng.random() < duplicates:
+            noise = rng.integers(-4, 5, previous.shape)
+            image = Image.fromarray(np.clip(previous.astype(int) + noise, 0, 255).astype(np.uint8))
+        else:
+            coarse = rng.integers(0, 255, (16, 16, 3), dtype=np.uint8)
+            image = Image.fromarray(coarse).resize((resolution, resolution), Image.BILINEAR)
+            previous = np.asarray(image)
+        image.save(os.path.join(folder, f"synthetic-event-{i % events}_{i:05d}.png"))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_durations(events, end):
+    """Turns ordered (stage, start_time) pairs into {stage: seconds}."""
+    durations = {}
+    for (stage, start), (_, next_start) in zip(events, events[1:] + [(None, end)]):
+        durations[stage] = round(durations.get(stage, 0.0) + next_start - start, 4)
+    return durations
+
+
+def summarize(snapshot, mean_name, digits):
+    """Request count and mean of a histogram snapshot."""
+    mean = snapshot["sum"] / snapshot["count"] if snapshot["count"] else 0.0
+    return {"requests": snapshot["count"], mean_name: round(mean, digits)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=32, help="Number of synthetic images")
+    parser.add_argument("--resolution", type=int, default=512, help="Width and height of each image")
+    parser.add_argument("--events", type=int, default=4, help="Distinct event prefixes in the file names")
+    parser.add_argument("--duplicates", type=float, default=0.0,
+                        help="Fraction of images that are near-duplicate frames of an earlier one")
+    parser.add_argument("--model", choices=("tiny", "segformer"), default="tiny",
+                        help="'tiny' uses a small randomly initialised SegFormer; 'segformer' loads the real checkpoint")
+    parser.add_argument("--backend", choices=("torch", "onnx"), default="torch",
+                        help="Segmentation backend (SEGMENTATION_BACKEND)")
+    parser.add_argument("--inference-workers", type=int, default=0,
+                        help="Run SegFormer in this many worker processes (INFERENCE_WORKERS)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Simulated seconds per web search")
+    parser.add_argument("--storage-latency", type=float, default=0.01, help="Simulated seconds to first byte per file")
+    parser.add_argument("--cache", action="store_true", help="Keep the persistent result cache enabled")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def run(args) -> dict:
+    # Configure before the pipeline modules read their settings at import time
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key-for-benchmarks")
+    os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("SEGMENTATION_RENDER_MODE", "mask")
+    if not args.cache:
+        os.environ["RESULT_CACHE_BYPASS"] = "1"
+    os.environ["INFERENCE_WORKERS"] = str(args.inference_workers)
+    os.environ["SEGMENTATION_BACKEND"] = args.backend
+    tiny_factory = "tiny_onnx_segmentation_model" if args.backend == "onnx" else "tiny_segmentation_model"
+    if args.model == "tiny":
+        os.environ["INFERENCE_MODEL_FACTORY"] = f"benchmarks.fakes:{tiny_factory}"
+
+    import benchmarks.fakes as fakes
+    from benchmarks.fakes import FakeDamageChatModel, FakeSearchTool, FakeTextChatModel, LocalFolderStorage
+    import main
+    import src.image_analysis.mask_analysis as mask_analysis
+    import src.image_analysis.model_registry as model_registry_module
+    from src.image_analysis.inference_pool import inference_pool
+    from src.image_analysis.model_registry import model_registry
+    from utils.download_manager import DownloadManager
+    from utils.memory import current_rss_mb, peak_rss_mb
+    from utils.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_IMAGE_BYTES
+
+    damage_model = FakeDamageChatModel(latency=args.llm_latency)
+    damage_model_id = mask_analysis.GEMINI_MODEL  # the fake stands in for the default model
+    text_model = FakeTextChatModel(latency=args.llm_latency)
+    search_tool = FakeSearchTool(latency=args.search_latency)
+    mask_analysis.google_model = damage_model
+    main.llm = text_model
+    main.search_web = search_tool
+    if args.model == "tiny":
+        model_registry_module.segmentation_model = getattr(fakes, tiny_factory)
+
+    timings = {}
+    with tempfile.TemporaryDirectory() as root:
+        make_synthetic_folder(os.path.join(root, "remote", "sweep"), args.images, args.resolution, args.events,
+                              duplicates=args.duplicates)
+        rss_baseline = current_rss_mb()
+
+        start = time.perf_counter()
+        manager = DownloadManager(LocalFolderStorage(os.path.join(root, "remote"), latency=args.storage_latency))
+        local_dir = os.path.join(root, "downloaded", "sweep")
+        download = manager.download("sweep", local_dir)
+        timings["download"] = round(time.perf_counter() - start, 4)
+
+        start = time.perf_counter()
+        if inference_pool:
+            inference_pool.start()
+            for _ in range(inference_pool.workers):
+                inference_pool.infer(np.zeros((1, 3, 64, 64), dtype=np.float32))  # waits for the models to load
+        else:
+            model_registry.load()
+        timings["model_load"] = round(time.perf_counter() - start, 4)
+
+        events = []
+        def progress(event, **data):
+            if event == "stage":
+                events.append((data["stage"], time.perf_counter()))
+
+        cwd = os.getcwd()
+        os.chdir(root)  # keep rendered masks inside the temporary directory
+        try:
+            start = time.perf_counter()
+            main.analyze_damage(local_dir, progress=progress)
+            end = time.perf_counter()
+        finally:
+            os.chdir(cwd)
+        timings.update(stage_durations(events, end))
+        analysis_seconds = end - start
+
+    return {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "stages_seconds": timings,
+        "analysis_seconds": round(analysis_seconds, 4),
+        "images_per_second": round(args.images / analysis_seconds, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(rss_baseline, 1),
+        "model": model_registry.stats(),
+        "inference_pool": inference_pool.stats() if inference_pool else None,
+        "download": download.metrics,
+        "llm_images": summarize(LLM_IMAGE_BYTES.snapshot(model=damage_model_id), "mean_bytes", 0),
+        "llm_first_token": summarize(LLM_FIRST_TOKEN_SECONDS.snapshot(model=damage_model_id), "mean_seconds", 4),
+        "calls": {
+            "damage_llm": damage_model.calls,
+            "text_llm": text_model.calls,
+            "web_search": search_tool.calls,
+        },
+    }
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
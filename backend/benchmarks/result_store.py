@@ -0,0 +1,154 @@
+# benchmarks/result_store.py
+"""
+Benchmark of the columnar result store on synthetic analyses.
+
+Appends `--folders` folder analyses of `--images` results each, spread over
+`--days` days and `--events` events, then times filtered queries, the
+per-event summary and compaction, and reports the size on disk:
+
+    python -m benchmarks.result_store --folders 200 --images 50
+    python -m benchmarks.result_store --no-masks
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DAY = 24 * 3600
+
+
+def synthetic_analysis(rng, folder_index, images, events, start, mask_side=160):
+    """One folder's detailed_analysis with blocky class masks like SegFormer's."""
+    event = f"synthetic-event-{folder_index % events}"
+    analyzed_at = start + folder_index * DAY / 10
+    results = []
+    for i in range(images):
+        coarse = rng.integers(0, 150, (10, 10), dtype=np.uint8)
+        mask = np.kron(coarse, np.ones((mask_side // 10, mask_side // 10), dtype=np.uint8))
+        score = int(rng.integers(0, 11))
+        results.append({
+            "image_path": f"downloaded/folder-{folder_index}/{event}_{i:05d}.png",
+            "damage_score": score,
+            "damage_explanation": f"Synthetic explanation {i} with collapsed roofs and debris. " * 3,
+            "heuristic_damage_score": float(score),
+            "mask_stats": {
+                "class_fractions": {"building": 0.3, "road": 0.1, "water": 0.05, "debris": 0.02},
+                "building_components": int(rng.integers(0, 50)),
+                "heuristic_damage_score": float(score),
+            },
+            "event": event,
+            "area_name": f"Inferred Area: synthetic area {folder_index % events}",
+            "mask": mask,
+            "analyzed_at": analyzed_at,
+        })
+    return results
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, round(time.perf_counter() - start, 4)
+
+
+def check_commit_order(store, appends=6) -> bool:
+    """Appends folders back to back (well within one second) and checks they list and query newest first."""
+    for i in range(appends):
+        store.append("user-1", f"f{i}", [{"image_path": f"f{i}/image.png", "damage_score": i}])
+    expected = [f"f{i}" for i in reversed(range(appends))]
+    listed = [store._meta(segment_id)["dictionaries"]["folder_path"][0] for segment_id in reversed(store.segments())]
+    queried = store.query(limit=3, columns=["folder_path"])["folder_path"].tolist()
+    return listed == expected and queried == expected[:3]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folders", type=int, default=200, help="Folder analyses appended")
+    parser.add_argument("--images", type=int, default=50, help="Results per folder")
+    parser.add_argument("--events", type=int, default=20, help="Distinct events")
+    parser.add_argument("--no-masks", action="store_true", help="Do not keep the class masks")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    from benchmarks.pipeline import git_revision
+    from src.pipeline.result_store import ResultStore
+    from utils.memory import current_rss_mb
+
+    rng = np.random.default_rng(0)
+    start = time.time() - args.folders * DAY / 10
+    analyses = [synthetic_analysis(rng, i, args.images, args.events, start) for i in range(args.folders)]
+
+    with tempfile.TemporaryDirectory() as root:
+        store = ResultStore(os.path.join(root, "results"), keep_masks=not args.no_masks)
+        _, append_seconds = timed(lambda: [
+            store.append("user-1", f"folder-{i}", analysis, {"image_path": analysis[0]["image_path"],
+                                                             "damage_score": 10, "justification": "Worst"})
+            for i, analysis in enumerate(analyses)
+        ])
+        del analyses
+        import pandas  # noqa: F401 -- keep the import out of the first query's time
+
+        recent = start + args.folders * DAY / 10 - 7 * DAY
+        filters = {
+            "event": {"event": "synthetic-event-3"},
+            "event_high_score": {"event": "synthetic-event-3", "min_score": 8},
+            "last_7_days_scores_only": {"since": recent, "columns": ["event", "damage_score"]},
+            "everything_latest": {"latest": True},
+        }
+
+        def run_queries():
+            queries = {}
+            for name, query_filters in filters.items():
+                df, seconds = timed(lambda: store.query(**query_filters))
+                queries[name] = {"rows": len(df), "seconds": seconds}
+            return queries
+
+        order_ok = check_commit_order(ResultStore(os.path.join(root, "ordering"), keep_masks=False))
+        segments_before = len(store.segments())
+        queries_before = run_queries()
+        _, compact_seconds = timed(store.compact)
+
+        rss_before = current_rss_mb()
+        queries = run_queries()
+        summary, summary_seconds = timed(store.summary)
+        first = store.query(limit=1)
+        mask = store.mask(first["segment"][0], int(first["row"][0]))
+
+        report = {
+            "revision": git_revision(),
+            "config": vars(args),
+            "python": sys.version.split()[0],
+            "rows": args.folders * args.images,
+            "append_seconds": append_seconds,
+            "compact_seconds": compact_seconds,
+            "segments": {"before_compaction": segments_before, "after_compaction": len(store.segments())},
+            "disk_bytes": directory_bytes(store.path),
+            "disk_bytes_per_row": round(directory_bytes(store.path) / (args.folders * args.images), 1),
+            "queries_before_compaction": queries_before,
+            "queries": queries,
+            "summary": {"groups": len(summary), "seconds": summary_seconds},
+            "query_rss_growth_mb": round(current_rss_mb() - rss_before, 1),
+            "mask_roundtrip_shape": list(mask.shape) if mask is not None else None,
+            "same_second_appends_in_order": order_ok,
+        }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if not order_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,146 @@
+# benchmarks/segmentation_backends.py
+"""
+Compares SegFormer variants and inference backends on the same images.
+
+Every variant/backend pair runs in a fresh process, so load time and peak
+memory are its own. Masks are compared with the reference pair (by default
+the most accurate one, b5 on torch) as pixel agreement and mean IoU:
+
+    python -m benchmarks.segmentation_backends --variants b0,b2,b5 --backends torch,onnx
+    python -m benchmarks.segmentation_backends --model tiny   # offline: random tiny model, torch vs onnx
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def measure(variant, backend, model, image_paths, batch_size, threads, scratch_dir) -> dict:
+    """Loads one variant/backend pair and segments every image. Runs in its own process."""
+    import torch
+    from PIL import Image
+    from utils.memory import peak_rss_mb
+
+    torch.set_num_threads(threads)
+    start = time.perf_counter()
+    if model == "tiny":
+        from benchmarks.fakes import tiny_segmentation_model
+        segformer, extractor = tiny_segmentation_model()
+        if backend == "onnx":
+            from src.image_analysis.onnx_backend import OnnxSegformer
+            segformer = OnnxSegformer.from_torch(segformer, extractor, os.path.join(scratch_dir, "tiny.onnx"))
+    else:
+        from src.image_analysis.segmentation_model import segmentation_model
+        segformer, extractor = segmentation_model(variant, backend)
+    segformer.eval()
+    load_seconds = time.perf_counter() - start
+
+    def segment(paths):
+        images = [Image.open(path).convert("RGB") for path in paths]
+        inputs = extractor(images=images, return_tensors="pt")
+        with torch.inference_mode():
+            logits = segformer(pixel_values=inputs["pixel_values"]).logits
+        return torch.argmax(logits, dim=1).to(torch.uint8).numpy()
+
+    segment(image_paths[:1])  # warmup
+    masks = []
+    start = time.perf_counter()
+    for i in range(0, len(image_paths), batch_size):
+        masks.extend(segment(image_paths[i:i + batch_size]))
+    seconds = time.perf_counter() - start
+
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "seconds_per_image": round(seconds / len(image_paths), 4),
+        "images_per_second": round(len(image_paths) / seconds, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "input_size": [extractor.size["height"], extractor.size["width"]],
+        "masks": masks,
+    }
+
+
+def agreement(masks, reference) -> dict:
+    """Pixel agreement and mean IoU against reference masks, upsampled to the reference resolution."""
+    from PIL import Image
+
+    matches, ious = [], []
+    for mask, ref in zip(masks, reference):
+        if mask.shape != ref.shape:
+            mask = np.asarray(Image.fromarray(mask).resize(ref.shape[::-1], Image.NEAREST))
+        matches.append(np.mean(mask == ref))
+        for label in np.union1d(np.unique(mask), np.unique(ref)):
+            a, b = mask == label, ref == label
+            ious.append(np.logical_and(a, b).sum() / np.logical_or(a, b).sum())
+    return {"pixel_agreement": round(float(np.mean(matches)), 4), "mean_iou": round(float(np.mean(ious)), 4)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=("segformer", "tiny"), default="segformer",
+                        help="tiny ignores --variants and needs no download")
+    parser.add_argument("--variants", default="b0,b2,b5", help="Comma-separated SegFormer variants")
+    parser.add_argument("--backends", default="torch,onnx", help="Comma-separated backends")
+    parser.add_argument("--reference", help="variant:backend the others are compared with (default: largest on torch)")
+    parser.add_argument("--images", type=int, default=16, help="Number of synthetic images")
+    parser.add_argument("--resolution", type=int, default=512, help="Width and height of each image")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per forward pass")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Intra-op threads")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    from benchmarks.pipeline import git_revision, make_synthetic_folder
+
+    variants = ["tiny"] if args.model == "tiny" else args.variants.split(",")
+    backends = args.backends.split(",")
+    pairs = [(variant, backend) for variant in variants for backend in backends]
+    reference = tuple(args.reference.split(":")) if args.reference else (max(variants), "torch")
+    if reference not in pairs:
+        pairs.insert(0, reference)
+
+    runs = {}
+    with tempfile.TemporaryDirectory() as root:
+        make_synthetic_folder(os.path.join(root, "images"), args.images, args.resolution)
+        image_paths = sorted(os.path.join(root, "images", name) for name in os.listdir(os.path.join(root, "images")))
+        for variant, backend in pairs:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    runs[(variant, backend)] = executor.submit(
+                        measure, variant, backend, args.model, image_paths, args.batch_size, args.threads, root,
+                    ).result()
+                except Exception as e:
+                    runs[(variant, backend)] = {"error": f"{type(e).__name__}: {e}"}
+
+    reference_masks = runs[reference].get("masks")
+    report_runs = {}
+    for (variant, backend), run in runs.items():
+        masks = run.pop("masks", None)
+        if masks is not None and reference_masks is not None:
+            run.update(agreement(masks, reference_masks))
+        report_runs[f"{variant}:{backend}"] = run
+
+    report = {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "reference": ":".join(reference),
+        "runs": report_runs,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,158 @@
+# benchmarks/startup.py
+"""
+Cold-start benchmark for the API server.
+
+Measures, in fresh interpreters:
+  * how long `import app` takes, and which modules dominate it;
+  * how long `uvicorn app:app` takes to accept a TCP connection;
+  * how long until /health/ready reports the model as loaded.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --model segformer --ready-timeout 300 --output startup.json
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    # Import-time code must not need real credentials
+    env.setdefault("GOOGLE_API_KEY", "fake-key-for-benchmarks")
+    env.setdefault("SUPABASE_URL", "http://localhost")
+    env.setdefault("SUPABASE_KEY", "fake-key-for-benchmarks")
+    return env
+
+
+def measure_import(repeats: int) -> list:
+    """Wall time of `import app` in `repeats` fresh interpreters."""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    return [
+        float(subprocess.check_output([sys.executable, "-c", code], cwd=BACKEND_DIR, env=child_env(), text=True))
+        for _ in range(repeats)
+    ]
+
+
+def slowest_imports(top: int) -> list:
+    """Top-level modules of `import app` by cumulative import time, from `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name[1:]
+        if name.startswith("  ") and not name.startswith("   "):  # direct children of `app`
+            modules.append({"module": name.strip(), "seconds": int(cumulative) / 1e6})
+    return sorted(modules, key=lambda m: m["seconds"], reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def ready_status(port: int) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+    try:
+        conn.request("GET", "/health/ready")
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+def measure_server(model: str, ready_timeout: float) -> dict:
+    """Starts the server in a child process and times it until it accepts and until it is ready."""
+    port = free_port()
+    cmd = [sys.executable, "-m", "benchmarks.startup", "--serve", str(port), "--model", model]
+    start = time.perf_counter()
+    server = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=child_env(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    accept_seconds = ready_seconds = None
+    try:
+        while time.perf_counter() - start < ready_timeout and server.poll() is None:
+            if accept_seconds is None:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                    accept_seconds = time.perf_counter() - start
+                except OSError:
+                    time.sleep(0.01)
+                    continue
+            if ready_status(port) == 200:
+                ready_seconds = time.perf_counter() - start
+                break
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {
+        "accept_seconds": round(accept_seconds, 3) if accept_seconds is not None else None,
+        "ready_seconds": round(ready_seconds, 3) if ready_seconds is not None else None,
+    }
+
+
+def serve(port: int, model: str):
+    """Child process entry point: runs uvicorn, optionally with the tiny random model."""
+    import uvicorn
+
+    if model == "tiny":
+        import src.image_analysis.model_registry as model_registry_module
+        from benchmarks.fakes import tiny_segmentation_model
+        model_registry_module.segmentation_model = tiny_segmentation_model
+    uvicorn.run("app:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters used to time `import app`")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to report")
+    parser.add_argument("--model", choices=("tiny", "segformer"), default="tiny",
+                        help="'tiny' uses a small randomly initialised SegFormer; 'segformer' loads the real checkpoint")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for /health/ready")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    if args.serve:
+        serve(args.serve, args.model)
+        return
+
+    from benchmarks.pipeline import git_revision
+
+    import_seconds = measure_import(args.repeats)
+    report = {
+        "revision": git_revision(),
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "import_seconds": {
+            "median": round(statistics.median(import_seconds), 3),
+            "min": round(min(import_seconds), 3),
+            "max": round(max(import_seconds), 3),
+        },
+        "slowest_imports": slowest_imports(args.top),
+        "server": measure_server(args.model, args.ready_timeout),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,6 +1,7 @@
 import os
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import langchain
 
@@ -11,85 +12,117 @@ from pydantic import BaseModel, Field
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
-from src.tools.image_analysis_tool import run_full_damage_analysis
+from src.tools.image_analysis_tool import full_damage_analysis
 from src.tools.web_search_tool import search_web
+from src.pipeline.evaluator import EvaluatorDecision, evaluate_most_urgent
+
+from utils.cache import result_cache, content_key
+from utils.metrics import span, llm_callbacks, LLM_REQUESTS
 
 from dotenv import load_dotenv
 load_dotenv()
 
-
-class EvaluatorDecision(BaseModel):
-    area_name: str = Field(..., description="Name of the area selected")
-    damage_score: float = Field(..., description="Damage score (potentially refined based on web context)", ge=0, le=10)
-    original_explanation: str = Field(..., description="Original explanation")
-    justification: str = Field(..., description="Justification for the choice, incorporating insights from the area name and web context")
-    image_path: str = Field(..., description="Original image path (for reference, not for display in final output)")
+AREA_CACHE_NAMESPACE = "area"
+AREA_CACHE_TTL_SECONDS = float(os.getenv("AREA_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+AREA_LOOKUP_CONCURRENCY = int(os.getenv("AREA_LOOKUP_CONCURRENCY", "4"))
 
 
 # Configure the API Key (assuming GEMINI_API_KEY is set in the environment)
 llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest")
 
-def analyze_damage(image_folder):
+def extract_event_name(image_path):
+    """Returns the event prefix of a file name like 'hurricane-michael_0001.png'."""
+    filename = os.path.basename(image_path)
+    event_name_match = re.match(r"([a-zA-Z0-9-]+?)_", filename)
+    return event_name_match.group(1) if event_name_match else "Unknown Event"
+
+def resolve_event_area(event_name):
+    """
+    Infers the affected area for an event and enriches it with web info.
+    Successful lookups are cached across requests for AREA_CACHE_TTL_SECONDS.
+    """
+    if event_name == "Unknown Event":
+        return "N/A (Unknown Event)"
+
+    key = content_key(event_name, llm.model, "area-v1")
+    cached = result_cache.get_json(AREA_CACHE_NAMESPACE, key, ttl_seconds=AREA_CACHE_TTL_SECONDS)
+    if cached is not None:
+        return cached
+
+    llm_area_query = f"Given the event name '{event_name}', what was the primary geographical area affected? Respond with only the name of the area, e.g., 'Florida Panhandle'."
+    try:
+        LLM_REQUESTS.inc(model=llm.model, purpose="area_inference")
+        with span("area_inference"):
+            llm_area_response = llm.invoke([HumanMessage(content=llm_area_query)], config={"callbacks": llm_callbacks(llm.model)})
+        inferred_area = llm_area_response.content.strip()
+
+        web_search_query = f"General information about {inferred_area}"
+        with span("web_search"):
+            area_search_result = search_web.invoke({"query": web_search_query})
+        area_name = f"Inferred Area: {inferred_area}. Web Info: {area_search_result[:200]}..."
+    except Exception as e:
+        # Failures are not cached so the next request retries the lookup
+        return f"N/A (Error inferring from {event_name})"
+
+    result_cache.set_json(AREA_CACHE_NAMESPACE, key, area_name)
+    return area_name
+
+def resolve_event_areas(event_names):
+    """Resolves each distinct event name once, concurrently. Returns {event_name: area_name}."""
+    unique_events = list(dict.fromkeys(event_names))
+    if not unique_events:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(AREA_LOOKUP_CONCURRENCY, len(unique_events)))) as executor:
+        return dict(zip(unique_events, executor.map(resolve_event_area, unique_events)))
+
+def evaluate_analysis(analysis_results, progress=None):
+    """
+    Adds area names to per-image results and picks the most urgent image.
+    Returns {"evaluator_decision", "detailed_analysis"}.
+    """
+    progress = progress or (lambda event, **data: None)
+
+    progress("stage", stage="area_inference")
+    event_names = [extract_event_name(item["image_path"]) for item in analysis_results]
+    event_areas = resolve_event_areas(event_names)
+
+    processed_analysis_results = []
+
+    for item, event_name in zip(analysis_results, event_names):
+        processed = {
+            "image_path": item["image_path"],
+            "damage_score": item["damage_score"],
+            "damage_explanation": item["damage_explanation"],
+            "heuristic_damage_score": item.get("heuristic_damage_score"),
+            "mask_stats": item.get("mask_stats"),
+            "event": event_name,
+            "area_name": event_areas[event_name]
+        }
+        if "duplicate_of" in item:
+            processed["duplicate_of"] = item["duplicate_of"]
+        if "mask" in item:
+            processed["mask"] = item["mask"]
+        processed_analysis_results.append(processed)
+
+    progress("stage", stage="evaluation")
+    # Near-duplicate frames share their representative's result, so only representatives compete
+    candidates = [item for item in processed_analysis_results if "duplicate_of" not in item]
+    try:
+        llm_output = evaluate_most_urgent(candidates, llm)
+        return {
+            "evaluator_decision": llm_output.model_dump(),
+            "detailed_analysis": processed_analysis_results
+        }
+    except Exception as e:
+        raise Exception(f"LLM Error: {str(e)}")
+
+def analyze_damage(image_folder, progress=None, image_paths=None, keep_masks=False):
+    progress = progress or (lambda event, **data: None)
     try:
         print("---> Executing Damage Analysis <---")
-        analysis_results = run_full_damage_analysis.invoke({"image_folder": image_folder})
-
-        processed_analysis_results = []
-
-        for item in analysis_results:
-            area_name = "N/A"
-            filename = os.path.basename(item["image_path"])
-            event_name_match = re.match(r"([a-zA-Z0-9-]+?)_", filename)
-            event_name = event_name_match.group(1) if event_name_match else "Unknown Event"
-
-            if event_name != "Unknown Event":
-                llm_area_query = f"Given the event name '{event_name}', what was the primary geographical area affected? Respond with only the name of the area, e.g., 'Florida Panhandle'."
-                try:
-                    llm_area_response = llm.invoke([HumanMessage(content=llm_area_query)])
-                    inferred_area = llm_area_response.content.strip()
-
-                    web_search_query = f"General information about {inferred_area}"
-                    area_search_result = search_web.invoke({"query": web_search_query})
-                    area_name = f"Inferred Area: {inferred_area}. Web Info: {area_search_result[:200]}..."
-                except Exception as e:
-                    area_name = f"N/A (Error inferring from {event_name})"
-            else:
-                area_name = "N/A (Unknown Event)"
-
-            processed_analysis_results.append({
-                "image_path": item["image_path"],
-                "damage_score": item["damage_score"],
-                "damage_explanation": item["damage_explanation"],
-                "area_name": area_name
-            })
-
-        # Format for evaluator
-        all_images_info = json.dumps(processed_analysis_results, indent=2)
-
-        evaluator_prompt_template = f"""You are a disaster evaluator. 
-        Below are image analyses with damage scores (0 to 10), explanations, and area names.
-Choose which area/image represents the **most urgent situation** based on the information provided. 
-Use the area name to enrich your understanding and refine the damage assessment, damage score, and justification.
-
-{all_images_info}
-"""
-
-        try:
-            model = llm.with_structured_output(EvaluatorDecision)
-            llm_output = model.invoke([HumanMessage(content=evaluator_prompt_template)])
-            
-            try:
-                urgent_situation = llm_output.model_dump()
-                return {
-                    "evaluator_decision": urgent_situation,
-                    "detailed_analysis": processed_analysis_results
-                }
-            except json.JSONDecodeError:
-                raise Exception(f"LLM response is not valid JSON: {llm_output}")
-
-        except Exception as e:
-            raise Exception(f"LLM Error: {str(e)}")
+        analysis_results = full_damage_analysis(image_folder, progress=progress, image_paths=image_paths,
+                                                keep_masks=keep_masks)
+        return evaluate_analysis(analysis_results, progress=progress)
 
     except Exception as e:
         raise Exception(f"Internal Error: {str(e)}")
-
@@ -0,0 +1,194 @@
+# src/image_analysis/dedup.py
+import os
+from itertools import islice
+
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+
+from utils.metrics import span, DEDUP_IMAGES
+
+load_dotenv()
+
+# === CONFIG ===
+DEDUP_ENABLED = os.getenv("DEDUP_NEAR_DUPLICATES", "true").strip().lower() in ("1", "true", "yes", "on")
+# Two images are near-duplicates when both their pHash and dHash differ in at most this many of 64 bits
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "4"))
+DEDUP_CHUNK_SIZE = int(os.getenv("DEDUP_CHUNK_SIZE", "32"))
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is D @ X @ D.T."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+DCT_MATRIX = _dct_matrix(PHASH_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def load_thumbnail(image_path: str) -> np.ndarray:
+    """Grayscale PHASH_SIZE x PHASH_SIZE thumbnail; JPEGs are decoded at reduced scale."""
+    with Image.open(image_path) as image:
+        image.draft("L", (PHASH_SIZE * 4, PHASH_SIZE * 4))
+        return np.asarray(image.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR), dtype=np.float32)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) booleans to N unsigned 64-bit integers."""
+    return (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+
+def phash(thumbnails: np.ndarray) -> np.ndarray:
+    """Perceptual hashes of a (N, 32, 32) batch: low-frequency DCT terms above their median."""
+    coefficients = np.einsum("ij,njk,lk->nil", DCT_MATRIX, thumbnails, DCT_MATRIX)
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(thumbnails), -1)
+    # The DC term only reflects overall brightness and is left out of the median
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+def dhash(thumbnails: np.ndarray) -> np.ndarray:
+    """Difference hashes of a (N, 32, 32) batch: sign of horizontal gradients on a 9x8 grid."""
+    n = len(thumbnails)
+    # Average-pool the 32x32 thumbnails to 8 rows of 9 columns
+    rows = thumbnails.reshape(n, HASH_SIZE, PHASH_SIZE // HASH_SIZE, PHASH_SIZE).mean(axis=2)
+    edges = np.linspace(0, PHASH_SIZE, HASH_SIZE + 2).astype(int)
+    grid = np.stack([rows[:, :, a:b].mean(axis=2) for a, b in zip(edges[:-1], edges[1:])], axis=2)
+    return _pack((grid[:, :, 1:] > grid[:, :, :-1]).reshape(n, -1))
+
+
+def hash_images(image_paths: list) -> list:
+    """(phash, dhash) integer pairs for a batch of images."""
+    if not image_paths:
+        return []
+    thumbnails = np.stack([load_thumbnail(path) for path in image_paths])
+    return list(zip(phash(thumbnails).tolist(), dhash(thumbnails).tolist()))
+
+
+def hash_distance(a: tuple, b: tuple) -> int:
+    """Larger of the pHash and dHash Hamming distances; a metric, as the BK-tree requires."""
+    return max((a[0] ^ b[0]).bit_count(), (a[1] ^ b[1]).bit_count())
+
+
+class BKTree:
+    """Burkhard-Keller tree over hash pairs for radius queries under hash_distance."""
+
+    def __init__(self):
+        self._root = None
+
+    def add(self, key: tuple, value):
+        node = [key, value, {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hash_distance(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key: tuple, radius: int) -> list:
+        """Returns (distance, value) for every entry within `radius` of `key`."""
+        if self._root is None:
+            return []
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            distance = hash_distance(key, node_key)
+            if distance <= radius:
+                matches.append((distance, value))
+            # Triangle inequality: only subtrees at distance ± radius can match
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return matches
+
+
+class DuplicateFilter:
+    """
+    Streams image paths and keeps only one representative per cluster of
+    near-duplicates.
+
+    Paths are hashed in chunks of `chunk_size` with vectorized pHash/dHash.
+    Each image joins the closest representative within `max_distance`, or
+    becomes a new representative. Representatives are yielded as soon as
+    their chunk is hashed, so downstream stages keep streaming; `members`
+    maps each representative to the duplicates it stands for.
+    """
+
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE, chunk_size: int = DEDUP_CHUNK_SIZE):
+        self.max_distance = max_distance
+        self.chunk_size = chunk_size
+        self.members = {}
+        self._tree = BKTree()
+
+    def filter(self, image_paths):
+        iterator = iter(image_paths)
+        while True:
+            chunk = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            with span("dedup"):
+                hashes = self._hash_chunk(chunk)
+            for path, key in zip(chunk, hashes):
+                representative = self._assign(path, key)
+                if representative is None:
+                    DEDUP_IMAGES.inc(outcome="representative")
+                    yield path
+                else:
+                    DEDUP_IMAGES.inc(outcome="duplicate")
+
+    def _hash_chunk(self, chunk: list) -> list:
+        try:
+            return hash_images(chunk)
+        except Exception:
+            # One unreadable file should not disable dedup for the whole chunk
+            hashes = []
+            for path in chunk:
+                try:
+                    hashes.extend(hash_images([path]))
+                except Exception:
+                    hashes.append(None)
+            return hashes
+
+    def _assign(self, path: str, key):
+        """Returns the representative `path` duplicates, or None if it is a new one."""
+        if key is None:
+            # Unhashable images are always analyzed on their own
+            self.members.setdefault(path, [])
+            return None
+        matches = self._tree.search(key, self.max_distance)
+        if matches:
+            _, representative = min(matches, key=lambda match: match[0])
+            self.members[representative].append(path)
+            return representative
+        self._tree.add(key, path)
+        self.members[path] = []
+        return None
+
+    def expand(self, results: list) -> list:
+        """
+        Adds a copy of each representative's result for every duplicate it
+        stands for, marked with `duplicate_of`.
+        """
+        expanded = []
+        for item in results:
+            expanded.append(item)
+            for duplicate in self.members.get(item["image_path"], []):
+                expanded.append({**item, "image_path": duplicate, "duplicate_of": item["image_path"]})
+        return expanded
+
+    def stats(self) -> dict:
+        duplicates = sum(len(members) for members in self.members.values())
+        return {"representatives": len(self.members), "duplicates": duplicates}
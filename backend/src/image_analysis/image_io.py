@@ -0,0 +1,62 @@
+# src/image_analysis/image_io.py
+import os
+import struct
+
+from PIL import Image, UnidentifiedImageError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === CONFIG ===
+# Satellite scenes legitimately exceed Pillow's ~89 MP decompression-bomb limit; this is the
+# limit for files opened with `open_image` instead (default 1 GP, e.g. a 31k x 31k scene)
+LARGE_IMAGE_MAX_PIXELS = int(os.getenv("LARGE_IMAGE_MAX_PIXELS", str(1_000_000_000)))
+
+
+def open_image(image_path: str, max_pixels: int = LARGE_IMAGE_MAX_PIXELS) -> Image.Image:
+    """
+    Image.open for images that may be far larger than Pillow allows.
+
+    Pillow checks Image.MAX_IMAGE_PIXELS, a process-wide global, right after
+    a format plugin has read the header; changing the global around a call
+    would switch the check off for every other thread decoding at the time.
+    This asks the plugins to read the header directly and applies
+    `max_pixels` instead, so it is safe to call from any thread. Like
+    Image.open, only the header is read until the pixels are used.
+    """
+    Image.init()
+    fp = open(image_path, "rb")
+    try:
+        prefix = fp.read(16)
+        for fmt in Image.ID:
+            factory, accept = Image.OPEN[fmt]
+            # Plugins answer with a string to explain why they reject a file
+            accepted = not accept or accept(prefix)
+            if not accepted or isinstance(accepted, str):
+                continue
+            fp.seek(0)
+            try:
+                image = factory(fp, image_path)
+            except (SyntaxError, IndexError, TypeError, struct.error):
+                continue
+            width, height = image.size
+            if max_pixels and width * height > max_pixels:
+                image.close()
+                raise Image.DecompressionBombError(
+                    f"Image size ({width * height} pixels) exceeds limit of {max_pixels} pixels, "
+                    "could be decompression bomb DOS attack."
+                )
+            # Let the image close the file it was opened from, as Image.open does
+            image._exclusive_fp = True
+            return image
+    except BaseException:
+        fp.close()
+        raise
+    fp.close()
+    raise UnidentifiedImageError(f"cannot identify image file {image_path!r}")
+
+
+def image_size(image_path: str) -> tuple:
+    """(width, height) from the header alone, however large the image is."""
+    with open_image(image_path, max_pixels=None) as image:
+        return image.size
@@ -1,81 +1,160 @@
 import os
+import tempfile
 import torch
 import uuid
 from PIL import Image
-import matplotlib.pyplot as plt
 import numpy as np
-from transformers import SegformerFeatureExtractor, SegformerForSemanticSegmentation
+
+from src.image_analysis.mask_stats import compute_mask_stats
+from src.image_analysis.rendering import RENDER_MODE, RENDER_MODES, renderer, save_mask
+from src.image_analysis.tiling import segment_tiled
+from utils.cache import result_cache, file_digest, content_key
+from utils.metrics import span
 
 # === CONFIG ===
 OUTPUT_ROOT = "outputs"
-
-def image_segmentation(image_data, model, extractor , output_folder=OUTPUT_ROOT):
-    # === Utility Functions ===
-    def apply_colormap(mask):
-        colormap = plt.cm.get_cmap('jet')
-        colored_mask = colormap(mask / mask.max())
-        return (colored_mask[:, :, :3] * 255).astype(np.uint8)
-
-    def save_outputs(image, mask, overlay, output_dir, filename_base):
-        image.save(os.path.join(output_dir, f"{filename_base}_original.png"))
-        mask.save(os.path.join(output_dir, f"{filename_base}_mask.png"))
-        overlay.save(os.path.join(output_dir, f"{filename_base}_overlay.png"))
-
-    # === Create unique output directory ===
+DEFAULT_BATCH_SIZE = int(os.getenv("SEGMENTATION_BATCH_SIZE", "8"))
+MEMORY_BUDGET_MB = os.getenv("SEGMENTATION_MEMORY_BUDGET_MB")
+MASK_CACHE_NAMESPACE = "mask"
+# Longest side of the label grid used for mask statistics of tiled images; matches the
+# 1/4-resolution masks of untiled images (128-160 px), so building component sizes
+# mean the same thing on both paths
+STATS_MAX_SIDE = 160
+# Rough activation multiplier over the raw input/logit tensors for a SegFormer forward pass
+ACTIVATION_FACTOR = 12
+
+
+def estimate_image_memory_mb(model, extractor) -> float:
+    """Estimates the memory one image costs inside a forward pass, in MB."""
+    size = getattr(extractor, "size", None) or {}
+    height = size.get("height", 640) if isinstance(size, dict) else size
+    width = size.get("width", 640) if isinstance(size, dict) else size
+    num_labels = getattr(model.config, "num_labels", 150)
+
+    pixel_bytes = 3 * height * width * 4
+    logit_bytes = num_labels * (height // 4) * (width // 4) * 4
+    return (pixel_bytes + logit_bytes) * ACTIVATION_FACTOR / (1024 * 1024)
+
+
+def resolve_batch_size(model, extractor, batch_size=None, memory_budget_mb=None) -> int:
+    """Picks the chunk size from an explicit batch size or a memory budget."""
+    if batch_size:
+        return max(1, int(batch_size))
+    if memory_budget_mb is None and MEMORY_BUDGET_MB:
+        memory_budget_mb = float(MEMORY_BUDGET_MB)
+    if memory_budget_mb:
+        per_image_mb = estimate_image_memory_mb(model, extractor)
+        return max(1, int(memory_budget_mb // per_image_mb))
+    return DEFAULT_BATCH_SIZE
+
+
+def mask_cache_key(image_path: str, model) -> str:
+    """Cache key for a predicted mask: image content + model checkpoint."""
+    model_id = getattr(model.config, "_name_or_path", "") or type(model).__name__
+    return content_key(file_digest(image_path), model_id)
+
+
+def decode_chunk(chunk, model, extractor, use_cache=True) -> dict:
+    """
+    CPU half of a segmentation chunk: decodes the images, looks up cached
+    masks and preprocesses the images that still need inference.
+    """
+    with span("preprocessing"):
+        images = [Image.open(item["image_path"]).convert("RGB") for item in chunk]
+
+    keys = [mask_cache_key(item["image_path"], model) if use_cache else None for item in chunk]
+    masks = [result_cache.get_array(MASK_CACHE_NAMESPACE, key) if key else None for key in keys]
+    missing = [i for i, mask in enumerate(masks) if mask is None]
+
+    inputs = None
+    if missing:
+        with span("preprocessing"):
+            inputs = extractor(images=[images[i] for i in missing], return_tensors="pt")
+
+    return {"items": chunk, "images": images, "keys": keys, "masks": masks, "missing": missing, "inputs": inputs}
+
+
+def infer_chunk(decoded: dict, model, pool=None) -> list:
+    """
+    Model half of a segmentation chunk. Returns (image_info, image, mask) tuples.
+    With an InferencePool, the forward pass runs in a worker process instead.
+    """
+    masks = decoded["masks"]
+    if decoded["missing"]:
+        if pool is not None:
+            with span("inference"):
+                predicted_masks = pool.infer(decoded["inputs"]["pixel_values"].numpy())
+        else:
+            with span("inference"), torch.inference_mode():
+                outputs = model(**decoded["inputs"])
+                # 150 ADE20K classes fit in uint8, which keeps the masks 8x smaller than int64
+                predicted_masks = torch.argmax(outputs.logits, dim=1).to(torch.uint8).cpu().numpy()
+            del outputs
+        decoded["inputs"] = None
+
+        for i, mask in zip(decoded["missing"], predicted_masks):
+            masks[i] = mask
+            if decoded["keys"][i]:
+                result_cache.set_array(MASK_CACHE_NAMESPACE, decoded["keys"][i], mask)
+        del predicted_masks
+
+    return list(zip(decoded["items"], decoded["images"], masks))
+
+
+def segment_large_image(image_info, model, extractor, output_dir):
+    """
+    Segments one large image with tiled inference. The native-resolution mask
+    is written as a .npy file in `output_dir`, or a discarded temporary file
+    when no output is requested.
+    """
+    image_path = image_info["image_path"]
+    filename_base = os.path.splitext(os.path.basename(image_path))[0]
+    if output_dir:
+        mask_path = os.path.join(output_dir, f"{filename_base}_mask.npy")
+        grid = segment_tiled(image_path, model, extractor, mask_path)
+    else:
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            grid = segment_tiled(image_path, model, extractor, os.path.join(scratch_dir, "mask.npy"))
+        mask_path = None
+
+    step = max(1, -(-max(grid.shape) // STATS_MAX_SIDE))
+    with span("mask_stats"):
+        mask_stats = compute_mask_stats(grid[::step, ::step])
+
+    return {
+        "image_path": image_path,
+        "segmentation_mask_path": mask_path,
+        "mask_stats": mask_stats,
+    }
+
+
+def make_output_dir(output_folder=OUTPUT_ROOT, render_mode=RENDER_MODE):
+    """Creates a unique directory for this run's masks, or returns None when nothing is rendered."""
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode '{render_mode}', expected one of {RENDER_MODES}")
+    if render_mode == "none":
+        return None
     unique_id = str(uuid.uuid4())[:8]
-    output_dir = os.path.join(OUTPUT_ROOT, unique_id)
+    output_dir = os.path.join(output_folder, unique_id)
     os.makedirs(output_dir, exist_ok=True)
-
-    # === Collect image paths ===
-    image_paths = [item["image_path"] for item in image_data]
-
-    # === Load and preprocess all images ===
-    images = [Image.open(p).convert("RGB") for p in image_paths]
-    inputs = extractor(images=images, return_tensors="pt")
-
-    # === Run model inference ===
-    with torch.no_grad():
-        outputs = model(**inputs)
-    logits = outputs.logits
-    predicted_masks = torch.argmax(logits, dim=1).cpu().numpy()
-
-    def save_composite_figure(image, mask, overlay, output_dir, filename_base):
-        fig, axs = plt.subplots(1, 3, figsize=(15, 5))
-
-        axs[0].imshow(image)
-        axs[0].set_title("Original")
-        axs[0].axis('off')
-
-        axs[1].imshow(mask, cmap='jet')
-        axs[1].set_title("Mask")
-        axs[1].axis('off')
-
-        axs[2].imshow(overlay)
-        axs[2].set_title("Overlay")
-        axs[2].axis('off')
-
-        plt.tight_layout()
-        fig_path = os.path.join(output_dir, f"{filename_base}_composite.png")
-        plt.savefig(fig_path, bbox_inches='tight')
-        plt.close()
-
-    # === Processing and saving results ===
-    processed_results = []
-    for i, image_info in enumerate(image_data):
-        image = images[i]
-        mask_np = predicted_masks[i]
-        resized_mask = Image.fromarray(mask_np.astype(np.uint8)).resize(image.size)
-
-        colored_mask = apply_colormap(np.array(resized_mask))
-        overlay = Image.blend(image, Image.fromarray(colored_mask), alpha=0.5)
-
-        filename_base = os.path.splitext(os.path.basename(image_info["image_path"]))[0]
-        save_composite_figure(image, resized_mask, overlay, output_dir, filename_base)
-        
-        processed_results.append({
-            "image_path": image_info["image_path"],
-            "segmentation_mask_path": os.path.join(output_dir, f"{filename_base}_mask.png") # Example of adding mask path
-        })
-
-    print(f"Saved results in: {output_dir}")
-    return processed_results
+    return output_dir
+
+
+def postprocess_segmentation(image_info, image, mask_np, output_dir, render_mode=RENDER_MODE) -> dict:
+    """Renders one predicted mask and computes its statistics."""
+    mask_path = None
+    if render_mode != "none":
+        with span("rendering"):
+            filename_base = os.path.splitext(os.path.basename(image_info["image_path"]))[0]
+            mask_path = save_mask(mask_np, image.size, output_dir, filename_base)
+            if render_mode in ("overlay", "composite"):
+                renderer.submit(image_info["image_path"], mask_np, output_dir, filename_base, render_mode)
+
+    with span("mask_stats"):
+        mask_stats = compute_mask_stats(mask_np)
+
+    return {
+        "image_path": image_info["image_path"],
+        "segmentation_mask_path": mask_path,
+        "mask_stats": mask_stats,
+    }
@@ -0,0 +1,482 @@
+# src/image_analysis/inference_pool.py
+import atexit
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.metrics import INFERENCE_BATCH_IMAGES
+
+load_dotenv()
+
+# === CONFIG ===
+# 0 keeps inference in the API process; N runs it in N dedicated worker processes
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+# torch intra-op threads per worker; defaults to an even share of the CPU cores
+INFERENCE_THREADS = os.getenv("INFERENCE_THREADS")
+# Pin each worker to its own set of cores so workers do not migrate onto each other's
+INFERENCE_PIN_CORES = os.getenv("INFERENCE_PIN_CORES", "true").strip().lower() in ("1", "true", "yes", "on")
+# Images in one forward pass, gathered across requests (and users)
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "16"))
+# How long an idle worker waits for more requests to fill its batch
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+# "module:function" returning (model, extractor); workers import it themselves
+INFERENCE_MODEL_FACTORY = os.getenv(
+    "INFERENCE_MODEL_FACTORY", "src.image_analysis.segmentation_model:segmentation_model"
+)
+
+
+class InferenceError(RuntimeError):
+    """Raised to callers when a worker fails on their images."""
+
+
+def _load_factory(spec: str):
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _attach(buffers: dict, name: str) -> shared_memory.SharedMemory:
+    """Attaches to a shared memory block by name, reusing the mapping across batches."""
+    if name not in buffers:
+        buffers[name] = shared_memory.SharedMemory(name=name)
+    return buffers[name]
+
+
+def _run_batch(model, buffers: dict, input_name: str, output_name: str, count: int, shape: tuple) -> tuple:
+    import torch
+
+    inputs = _attach(buffers, input_name)
+    outputs = _attach(buffers, output_name)
+    # torch reads the pixels straight out of shared memory; nothing is pickled
+    pixel_values = torch.from_numpy(np.ndarray((count, *shape), dtype=np.float32, buffer=inputs.buf))
+    with torch.inference_mode():
+        logits = model(pixel_values=pixel_values).logits
+        masks = torch.argmax(logits, dim=1).to(torch.uint8).numpy()
+    np.ndarray(masks.shape, dtype=np.uint8, buffer=outputs.buf)[...] = masks
+    return masks.shape[1:]
+
+
+def _worker_main(conn, factory_spec: str, num_threads: int, cores):
+    """Entry point of an inference worker process."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    from src.image_analysis.model_registry import ModelRegistry
+
+    try:
+        registry = ModelRegistry.from_env()
+        registry.num_threads = num_threads
+        registry.factory = _load_factory(factory_spec)
+        model, extractor = registry.get()
+    except Exception:
+        conn.send(("failed", traceback.format_exc()))
+        return
+    # The parent preprocesses images and keys its mask cache with these, so it never loads the weights itself
+    conn.send(("ready", {"stats": registry.stats(), "config": model.config, "extractor": extractor}))
+
+    buffers = {}
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            _, input_name, output_name, count, shape = message
+            # Buffers the parent has replaced are no longer needed
+            for name in [n for n in buffers if n not in (input_name, output_name)]:
+                buffers.pop(name).close()
+            try:
+                conn.send(("done", _run_batch(model, buffers, input_name, output_name, count, shape)))
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+    finally:
+        for shm in buffers.values():
+            shm.close()
+
+
+class _Request:
+    """One caller's images; may be split across several worker batches."""
+
+    def __init__(self, pixel_values: np.ndarray):
+        self.pixel_values = pixel_values
+        self.shape = pixel_values.shape[1:]
+        self.taken = 0
+        self.completed = 0
+        self.masks = None
+        self.future = Future()
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return len(self.pixel_values) - self.taken
+
+    def complete(self, start: int, masks: np.ndarray):
+        with self._lock:
+            if self.future.done():
+                return
+            if self.masks is None:
+                self.masks = np.empty((len(self.pixel_values), *masks.shape[1:]), dtype=np.uint8)
+            self.masks[start:start + len(masks)] = masks
+            self.completed += len(masks)
+            if self.completed == len(self.pixel_values):
+                self.future.set_result(self.masks)
+
+    def fail(self, error: Exception):
+        with self._lock:
+            if not self.future.done():
+                self.future.set_exception(error)
+
+
+class _Worker:
+    """Parent-side handle of one worker process and the shared memory it reads and writes."""
+
+    def __init__(self, index: int, cores):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.conn = None
+        self.inputs = None
+        self.outputs = None
+        # Bytes the input and output blocks can hold
+        self.capacity = (0, 0)
+        self.stats = {}
+
+    def ensure_buffers(self, shape: tuple, max_batch: int):
+        """
+        Makes sure the input and output blocks fit `max_batch` images of
+        `shape`. Blocks are sized in bytes and only ever grow, so batches of
+        alternating shapes reuse them instead of reallocating every time.
+        """
+        # Masks are uint8 and never larger than the model input, so this bound always fits
+        needed = (max_batch * int(np.prod(shape)) * 4, max_batch * int(np.prod(shape[1:])))
+        if all(have >= need for have, need in zip(self.capacity, needed)):
+            return
+        capacity = tuple(max(have, need) for have, need in zip(self.capacity, needed))
+        self.release_buffers()
+        self.inputs = shared_memory.SharedMemory(create=True, size=capacity[0])
+        self.outputs = shared_memory.SharedMemory(create=True, size=capacity[1])
+        self.capacity = capacity
+
+    def release_buffers(self):
+        for shm in (self.inputs, self.outputs):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.inputs = self.outputs = None
+        self.capacity = (0, 0)
+
+
+class InferencePool:
+    """
+    Pool of SegFormer worker processes with dynamic cross-request batching.
+
+    Each worker loads its own copy of the model and runs torch with a fixed
+    number of intra-op threads (optionally pinned to its own cores), so
+    concurrent jobs no longer fight over one process's threads and
+    throughput grows with the number of workers. The first worker to load
+    sends back the model config and feature extractor (`model_info`), which
+    is all the calling process needs for preprocessing.
+
+    Callers hand in preprocessed pixel batches. Whenever a worker is free,
+    it takes every pending image of the same shape, up to `max_batch`, from
+    any number of callers (waiting at most `max_wait_ms` to fill the batch),
+    so small chunks from different users share one forward pass. Pixels go
+    to the worker and masks come back through shared memory blocks owned by
+    the pool; only a few bytes of metadata cross the pipe.
+
+    The pool is started on first use, like the renderer pool.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, threads_per_worker: int = None,
+                 max_batch: int = INFERENCE_MAX_BATCH, max_wait_ms: float = INFERENCE_MAX_WAIT_MS,
+                 model_factory: str = INFERENCE_MODEL_FACTORY, pin_cores: bool = INFERENCE_PIN_CORES):
+        self.workers = max(1, workers)
+        if hasattr(os, "sched_getaffinity"):
+            self._cores = sorted(os.sched_getaffinity(0))
+        else:
+            self._cores = list(range(os.cpu_count() or 1))
+        if threads_per_worker is None:
+            threads_per_worker = int(INFERENCE_THREADS) if INFERENCE_THREADS else len(self._cores) // self.workers
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.model_factory = model_factory
+        # Pinning only helps when every worker can have cores of its own
+        self.pin_cores = pin_cores and self.workers * self.threads_per_worker <= len(self._cores)
+
+        self._pending = deque()
+        self._pending_images = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._workers = []
+        self._feeders = []
+        self._ready = 0
+        self._model_info = None
+        self.load_error = None
+        self.batches = 0
+        self.images = 0
+
+    @property
+    def status(self) -> str:
+        """One of "idle", "loading", "ready" or "failed"."""
+        if not self._started:
+            return "idle"
+        if self.load_error:
+            return "failed"
+        return "ready" if self._ready == self.workers else "loading"
+
+    def start(self) -> "InferencePool":
+        """Spawns the worker processes; their models load in the background."""
+        with self._start_lock:
+            if self._started:
+                return self
+            self._closed = False
+            for index in range(self.workers):
+                cores = None
+                if self.pin_cores:
+                    first = index * self.threads_per_worker
+                    cores = set(self._cores[first:first + self.threads_per_worker])
+                worker = _Worker(index, cores)
+                self._spawn(worker)
+                self._workers.append(worker)
+                feeder = threading.Thread(target=self._feed, args=(worker,), name=f"inference-feeder-{index}",
+                                          daemon=True)
+                feeder.start()
+                self._feeders.append(feeder)
+            self._started = True
+        # Shared memory blocks outlive the process unless they are unlinked
+        atexit.register(self.shutdown, wait=False)
+        return self
+
+    def _spawn(self, worker: _Worker):
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        worker.process = context.Process(
+            target=_worker_main, args=(child_conn, self.model_factory, self.threads_per_worker, worker.cores),
+            name=f"inference-worker-{worker.index}", daemon=True,
+        )
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+
+    def _wait_ready(self, worker: _Worker) -> bool:
+        """Blocks until the worker's model is loaded; False if it could not load."""
+        try:
+            kind, payload = worker.conn.recv()
+        except EOFError:
+            kind, payload = "failed", f"inference worker {worker.index} exited while loading"
+        if kind != "ready":
+            print(f"Inference worker {worker.index} failed to load the model:\n{payload}")
+            self._fail_pending(InferenceError(f"Inference workers failed to load: {payload}"), load_error=payload)
+            return False
+        worker.stats = payload["stats"]
+        with self._condition:
+            self._ready += 1
+            if self._model_info is None:
+                self._model_info = (payload["config"], payload["extractor"])
+            self._condition.notify_all()
+        return True
+
+    def model_info(self) -> tuple:
+        """
+        (config, extractor) of the workers' model, waiting for the first
+        worker to load it. Enough for the API process to preprocess images
+        and key cached masks without a model copy of its own.
+        """
+        if not self._started:
+            self.start()
+        with self._condition:
+            while self._model_info is None and not self.load_error:
+                self._condition.wait()
+            if self._model_info is None:
+                raise InferenceError(f"Inference workers failed to load: {self.load_error}")
+            return self._model_info
+
+    def submit(self, pixel_values) -> Future:
+        """Queues a (N, 3, H, W) float32 batch; the future resolves to (N, h, w) uint8 masks."""
+        if not self._started:
+            self.start()
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        request = _Request(pixel_values)
+        if len(pixel_values) == 0:
+            request.future.set_result(np.empty((0,), dtype=np.uint8))
+            return request.future
+        with self._condition:
+            # Checked under the lock that _fail_pending drains the queue with, so a request is
+            # either refused here or still queued when the workers fail and is failed with them
+            if self.load_error:
+                raise InferenceError(f"Inference workers failed to load: {self.load_error}")
+            if self._closed:
+                raise InferenceError("Inference pool is shut down")
+            self._pending.append(request)
+            self._pending_images += len(pixel_values)
+            self._condition.notify_all()
+        return request.future
+
+    def infer(self, pixel_values) -> np.ndarray:
+        """Blocking form of submit."""
+        return self.submit(pixel_values).result()
+
+    def _take_batch(self):
+        """
+        Waits for work and returns [(request, start, count)] covering at most
+        `max_batch` images of one shape, or None once the pool is closed.
+        """
+        with self._condition:
+            while True:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return None
+
+                # Give other callers a moment to add images to a partial batch
+                deadline = time.monotonic() + self.max_wait
+                while self._pending_images < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._pending:
+                    continue  # another worker took everything meanwhile
+
+                shape = self._pending[0].shape
+                batch, size = [], 0
+                for request in list(self._pending):
+                    if size == self.max_batch:
+                        break
+                    if request.shape != shape:
+                        continue
+                    count = min(request.remaining, self.max_batch - size)
+                    batch.append((request, request.taken, count))
+                    request.taken += count
+                    size += count
+                    if request.remaining == 0:
+                        self._pending.remove(request)
+                self._pending_images -= size
+                return batch
+
+    def _feed(self, worker: _Worker):
+        """Parent-side loop of one worker: gather a batch, hand it over, distribute the masks."""
+        if not self._wait_ready(worker):
+            return
+        try:
+            while True:
+                batch = self._take_batch()
+                if batch is None:
+                    break
+                if not self._run(worker, batch):
+                    self._fail_pending(InferenceError(f"Inference worker {worker.index} could not be restarted"))
+                    break
+        finally:
+            worker.release_buffers()
+
+    def _run(self, worker: _Worker, batch: list) -> bool:
+        """Runs one batch on `worker`; False if the worker died and could not be replaced."""
+        shape = batch[0][0].shape
+        count = sum(size for _, _, size in batch)
+        worker.ensure_buffers(shape, self.max_batch)
+
+        pixels = np.ndarray((count, *shape), dtype=np.float32, buffer=worker.inputs.buf)
+        offset = 0
+        for request, start, size in batch:
+            pixels[offset:offset + size] = request.pixel_values[start:start + size]
+            offset += size
+        del pixels
+
+        try:
+            worker.conn.send(("run", worker.inputs.name, worker.outputs.name, count, shape))
+            kind, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            kind, payload = "crashed", f"inference worker {worker.index} exited"
+
+        if kind != "done":
+            error = InferenceError(payload)
+            for request, _, _ in batch:
+                request.fail(error)
+            if kind == "crashed" and not self._closed:
+                # Replace the dead process so later batches still have a worker
+                print(f"Restarting inference worker {worker.index}: {payload}")
+                with self._condition:
+                    self._ready -= 1
+                worker.release_buffers()
+                self._spawn(worker)
+                return self._wait_ready(worker)
+            return True
+
+        INFERENCE_BATCH_IMAGES.observe(count)
+        self.batches += 1
+        self.images += count
+        masks = np.ndarray((count, *payload), dtype=np.uint8, buffer=worker.outputs.buf)
+        offset = 0
+        for request, start, size in batch:
+            request.complete(start, masks[offset:offset + size])
+            offset += size
+        del masks
+        return True
+
+    def _fail_pending(self, error: Exception, load_error: str = None):
+        """Fails every queued request; with `load_error`, also refuses new ones from now on."""
+        with self._condition:
+            if load_error is not None:
+                self.load_error = load_error
+                self._condition.notify_all()
+            pending, self._pending = list(self._pending), deque()
+            self._pending_images = 0
+        for request in pending:
+            request.fail(error)
+
+    def stats(self) -> dict:
+        return {
+            "status": self.status,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "pinned": self.pin_cores,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch": round(self.images / self.batches, 2) if self.batches else None,
+            "pending_images": self._pending_images,
+            "error": self.load_error,
+            "model": self._workers[0].stats if self._workers else {},
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stops the workers; requests still queued fail with InferenceError."""
+        with self._start_lock:
+            if not self._started:
+                return
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            self._fail_pending(InferenceError("Inference pool is shut down"))
+            for feeder in self._feeders:
+                feeder.join(timeout=None if wait else 1)
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except (OSError, BrokenPipeError):
+                    pass
+                worker.process.join(timeout=None if wait else 1)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                worker.conn.close()
+            self._workers, self._feeders = [], []
+            self._ready = 0
+            self._started = False
+        atexit.unregister(self.shutdown)
+
+
+# Shared instance used by the analysis tools when INFERENCE_WORKERS > 0
+inference_pool = InferencePool() if INFERENCE_WORKERS > 0 else None
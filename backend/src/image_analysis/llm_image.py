@@ -0,0 +1,75 @@
+# src/image_analysis/llm_image.py
+import io
+import os
+
+from PIL import Image
+from dotenv import load_dotenv
+
+from src.image_analysis.image_io import open_image
+
+load_dotenv()
+
+# === CONFIG ===
+# Gemini tiles images internally at well under this size, so larger uploads only add latency
+LLM_IMAGE_MAX_SIDE = int(os.getenv("GEMINI_IMAGE_MAX_SIDE", "1024"))
+LLM_IMAGE_FORMAT = os.getenv("GEMINI_IMAGE_FORMAT", "jpeg").lower()  # "jpeg", "png" or "webp"
+LLM_IMAGE_QUALITY = int(os.getenv("GEMINI_IMAGE_QUALITY", "85"))
+
+MIME_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+def _source_header(image_path: str) -> tuple:
+    """(format, size) of the file on disk, read from its header only."""
+    try:
+        with Image.open(image_path) as image:
+            return (image.format or "").lower(), image.size
+    except OSError:
+        return None, None
+
+
+def encode_for_llm(image: Image.Image, image_path: str = None, max_side: int = LLM_IMAGE_MAX_SIDE,
+                   fmt: str = LLM_IMAGE_FORMAT, quality: int = LLM_IMAGE_QUALITY) -> dict:
+    """
+    Downscales an already-decoded image to `max_side` and encodes it as `fmt`.
+
+    Returns {"mime_type", "data", "width", "height", "source_bytes"}. When the
+    image needed no resizing and the original file is already in `fmt` and
+    smaller than the re-encoded version, the original bytes are sent instead.
+    """
+    if fmt not in MIME_TYPES:
+        raise ValueError(f"Unknown LLM image format '{fmt}', expected one of {tuple(MIME_TYPES)}")
+
+    resized = image
+    if max(image.size) > max_side:
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+    if fmt == "jpeg" and resized.mode not in ("RGB", "L"):
+        resized = resized.convert("RGB")
+
+    buffer = io.BytesIO()
+    options = {"quality": quality} if fmt in ("jpeg", "webp") else {"optimize": True}
+    resized.save(buffer, format=fmt.upper(), **options)
+    data = buffer.getvalue()
+
+    source_bytes = os.path.getsize(image_path) if image_path else None
+    if resized is image and source_bytes is not None and source_bytes <= len(data) \
+            and _source_header(image_path) == (fmt, image.size):
+        with open(image_path, "rb") as f:
+            data = f.read()
+
+    return {
+        "mime_type": MIME_TYPES[fmt],
+        "data": data,
+        "width": resized.width,
+        "height": resized.height,
+        "source_bytes": source_bytes,
+    }
+
+
+def load_for_llm(image_path: str, max_side: int = LLM_IMAGE_MAX_SIDE, fmt: str = LLM_IMAGE_FORMAT,
+                 quality: int = LLM_IMAGE_QUALITY) -> dict:
+    """Like encode_for_llm, for images that are not decoded yet; JPEGs are decoded at reduced scale."""
+    # Tiled satellite images are legitimately huge, so Pillow's own pixel limit does not apply
+    with open_image(image_path) as image:
+        image.draft("RGB", (max_side, max_side))
+        return encode_for_llm(image.convert("RGB"), image_path, max_side, fmt, quality)
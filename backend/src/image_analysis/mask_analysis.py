@@ -1,49 +1,34 @@
 # src/image_analysis/mask_analysis.py
 import os
 import base64
+import hashlib
 from typing import Dict
 from langchain.schema.messages import HumanMessage
-from langchain.chat_models import init_chat_model
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+from utils.cache import result_cache, file_digest, content_key
+from src.image_analysis.llm_image import load_for_llm
+from utils.metrics import span, llm_callbacks, LLM_REQUESTS, LLM_IMAGE_BYTES
+from utils.rate_limiter import TokenBucket, retry_with_backoff
+
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
-    raise ValueError("Google API Key Not Found")
+# Concurrency limits for batch scoring
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
 
 # Pydantic model for structured output
 class DamageAnalysisResult(BaseModel):
   damage_explanation: str = Field(description="An explanation of the damage assessment")
   damage_score: int = Field(description="A score between 0 and 10, where 10 is extremely damaged")
 
-# Initialize the chat model
-google_model = init_chat_model(
-    model="gemini-2.0-flash",
-    model_provider="google_genai",
-    api_key=GOOGLE_API_KEY
-).with_structured_output(DamageAnalysisResult)
-
-def encode_image_to_base64(image_path: str) -> str:
-    """Encodes an image file to a base64 string."""
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode("utf-8")
-
-def analyze_image(image_path: str) -> DamageAnalysisResult:
-    """
-    Analyzes a single image for damage assessment.
-
-    Args:
-        image_path: The path to the image file.
+GEMINI_MODEL = "gemini-2.0-flash"
 
-    Returns:
-        A DamageAnalysisResult object containing the analysis.
-    """
-    base64_image = encode_image_to_base64(image_path)
-
-    prompt = f"""
+DAMAGE_PROMPT = """
 You are a disaster analysis expert.
 1. Analyze the image provided.
 2. Provide a concise explanation (3-4 sentences) of the visible disaster or damage.
@@ -54,16 +39,116 @@ INSTRUCTIONS:
 - Your analysis is critical for emergency response, so be accurate.
 """
 
+# Cached results are invalidated whenever the prompt text changes
+PROMPT_VERSION = hashlib.sha256(DAMAGE_PROMPT.encode("utf-8")).hexdigest()[:12]
+CACHE_NAMESPACE = "damage"
+
+# The chat model is initialized on first use, so a missing key only fails scoring
+google_model = None
+
+def get_google_model():
+    """Returns the structured-output Gemini model, creating it on first use."""
+    global google_model
+    if google_model is None:
+        if not GOOGLE_API_KEY:
+            raise ValueError("Google API Key Not Found")
+        from langchain.chat_models import init_chat_model
+        google_model = init_chat_model(
+            model=GEMINI_MODEL,
+            model_provider="google_genai",
+            api_key=GOOGLE_API_KEY
+        ).with_structured_output(DamageAnalysisResult)
+    return google_model
+
+def damage_cache_key(image_path: str, model=None) -> str:
+    """Cache key for an image's analysis: image content + model + prompt version."""
+    model_id = GEMINI_MODEL if model is None else getattr(model, "model_name", type(model).__name__)
+    return content_key(file_digest(image_path), model_id, PROMPT_VERSION)
+
+def _invoke_model(image_path: str, model=None, llm_image: dict = None) -> DamageAnalysisResult:
+    # Segmentation hands over an image it already decoded and downscaled; otherwise read the file
+    if llm_image is None:
+        with span("llm_image_encoding"):
+            llm_image = load_for_llm(image_path)
+    base64_image = base64.b64encode(llm_image["data"]).decode("utf-8")
+
     message = HumanMessage(
         content=[
-            {"type": "text", "text": prompt},
+            {"type": "text", "text": DAMAGE_PROMPT},
             {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{base64_image}"},
+                "image_url": {"url": f"data:{llm_image['mime_type']};base64,{base64_image}"},
             },
         ]
     )
 
     # The LLM call now directly returns the Pydantic object
-    result = google_model.invoke([message])
-    return result
\ No newline at end of file
+    model_id = GEMINI_MODEL if model is None else getattr(model, "model_name", type(model).__name__)
+    LLM_REQUESTS.inc(model=model_id, purpose="damage_scoring")
+    LLM_IMAGE_BYTES.observe(len(llm_image["data"]), model=model_id)
+    with span("llm_scoring"):
+        result = (model or get_google_model()).invoke([message], config={"callbacks": llm_callbacks(model_id)})
+    return result
+
+def _cached_result(key: str):
+    cached = result_cache.get_json(CACHE_NAMESPACE, key)
+    return DamageAnalysisResult(**cached) if cached is not None else None
+
+def _store_result(key: str, result: DamageAnalysisResult):
+    result_cache.set_json(CACHE_NAMESPACE, key, result.model_dump())
+
+def analyze_image(image_path: str, model=None, use_cache: bool = True) -> DamageAnalysisResult:
+    """
+    Analyzes a single image for damage assessment.
+
+    Args:
+        image_path: The path to the image file.
+        model: Optional structured-output chat model; defaults to Gemini.
+        use_cache: Look up and store the result in the persistent result cache.
+
+    Returns:
+        A DamageAnalysisResult object containing the analysis.
+    """
+    if not use_cache:
+        return _invoke_model(image_path, model)
+
+    key = damage_cache_key(image_path, model)
+    result = _cached_result(key)
+    if result is None:
+        result = _invoke_model(image_path, model)
+        _store_result(key, result)
+    return result
+
+
+class DamageScorer:
+    """
+    Scores images one at a time with caching, a shared token bucket and
+    retries. Thread-safe, so a pool of workers can share one scorer; the
+    token bucket keeps their combined rate under `requests_per_minute`.
+    """
+
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+                 max_retries: int = GEMINI_MAX_RETRIES, model=None, use_cache: bool = True):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.model = model
+        self.use_cache = use_cache
+        self.bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=self.max_concurrency)
+
+    def cached(self, image_path: str):
+        """Returns (cache key, cached result or None)."""
+        if not self.use_cache:
+            return None, None
+        key = damage_cache_key(image_path, self.model)
+        return key, _cached_result(key)
+
+    def score(self, image_path: str, llm_image: dict = None, key: str = None) -> DamageAnalysisResult:
+        """Calls the model for one image; `key` is the cache key from `cached`."""
+        def call():
+            self.bucket.acquire()
+            return _invoke_model(image_path, self.model, llm_image)
+        result = retry_with_backoff(call, max_retries=self.max_retries)
+        if key:
+            _store_result(key, result)
+        return result
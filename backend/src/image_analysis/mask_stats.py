@@ -0,0 +1,145 @@
+# src/image_analysis/mask_stats.py
+import os
+
+import numpy as np
+
+# === CONFIG ===
+# ADE20K class ids (as predicted by the SegFormer ADE checkpoints) grouped by what matters for triage
+CLASS_GROUPS = {
+    "building": (1, 25, 48, 79, 84),        # building, house, skyscraper, hovel, tower
+    "road": (6, 11, 52, 54, 91),            # road, sidewalk, path, runway, dirt track
+    "water": (21, 26, 60, 113, 128),        # water, sea, river, waterfall, lake
+    "vegetation": (4, 9, 17, 29, 72),       # tree, grass, plant, field, palm
+    "debris": (13, 34, 46, 94),             # earth, rock, sand, land (bare ground where structures stood)
+    "vehicle": (20, 76, 80, 83, 102),       # car, boat, bus, truck, van
+}
+
+# Building blobs smaller than this (in mask pixels) read as rubble rather than intact structures
+INTACT_BUILDING_PIXELS = 50
+
+# Heuristic scores inside this band are ambiguous and should be confirmed by the LLM
+AMBIGUOUS_LOW = float(os.getenv("TRIAGE_AMBIGUOUS_LOW", "2.5"))
+AMBIGUOUS_HIGH = float(os.getenv("TRIAGE_AMBIGUOUS_HIGH", "7.5"))
+
+_GROUP_LUT = {
+    group: np.isin(np.arange(256), ids) for group, ids in CLASS_GROUPS.items()
+}
+
+
+def class_fractions(mask: np.ndarray) -> np.ndarray:
+    """Fraction of pixels per class id of a uint8 mask, as a dense vector of length 256."""
+    counts = np.bincount(mask.ravel(), minlength=256)
+    return counts / max(mask.size, 1)
+
+
+def _row_runs(binary: np.ndarray):
+    """(row, start, end) of every horizontal run of True pixels, in row-major order; `end` is exclusive."""
+    height, width = binary.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = binary
+    edges = np.flatnonzero(np.diff(padded, axis=1))
+    rows, columns = np.divmod(edges, width + 1)
+    return rows[::2], columns[::2], columns[1::2]
+
+
+def _run_roots(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int) -> np.ndarray:
+    """
+    Union-find over runs: runs in adjacent rows that overlap are 4-connected.
+    Returns the root run index of each run.
+    """
+    count = rows.size
+    # Overlapping runs of the previous row form a contiguous range, found with two binary searches
+    stride = width + 1
+    query = (rows - 1) * stride
+    lo = np.searchsorted(rows * stride + ends, query + starts, side="right")
+    hi = np.searchsorted(rows * stride + starts, query + ends, side="left")
+    overlaps = np.maximum(hi - lo, 0)
+    current = np.repeat(np.arange(count), overlaps)
+    previous = np.arange(overlaps.sum()) - np.repeat(np.cumsum(overlaps) - overlaps, overlaps) + np.repeat(lo, overlaps)
+
+    parent = np.arange(count)
+    while True:
+        # Full path compression, then hook every edge's larger root onto its smaller one
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        a, b = parent[current], parent[previous]
+        pending = a != b
+        if not pending.any():
+            return parent
+        a, b = a[pending], b[pending]
+        np.minimum.at(parent, np.maximum(a, b), np.minimum(a, b))
+
+
+def label_components(binary: np.ndarray) -> np.ndarray:
+    """
+    Labels 4-connected components of a boolean mask; background is 0.
+
+    Works on horizontal runs rather than pixels: runs are found with one
+    vectorized diff, overlapping runs of adjacent rows are joined with
+    union-find, and labels are painted back run by run. The cost is linear
+    in the number of pixels whatever the shape of the components.
+    """
+    labels = np.zeros(binary.shape, dtype=np.int32)
+    rows, starts, ends = _row_runs(binary)
+    if rows.size:
+        _, run_labels = np.unique(_run_roots(rows, starts, ends, binary.shape[1]), return_inverse=True)
+        labels[binary] = np.repeat(run_labels + 1, ends - starts)
+    return labels
+
+
+def component_sizes(binary: np.ndarray) -> np.ndarray:
+    """Pixel counts of each connected component of a boolean mask."""
+    rows, starts, ends = _row_runs(binary)
+    if not rows.size:
+        return np.array([], dtype=np.int64)
+    roots = _run_roots(rows, starts, ends, binary.shape[1])
+    sizes = np.bincount(roots, weights=ends - starts)
+    return sizes[sizes > 0].astype(np.int64)
+
+
+def damage_heuristic(fractions: dict, building_components: int, mean_building_pixels: float) -> float:
+    """
+    Deterministic 0-10 damage estimate from mask statistics.
+
+    Combines how much bare ground/debris there is relative to built-up area,
+    how much water covers land that is normally dry, and how fragmented the
+    remaining buildings are.
+    """
+    eps = 1e-6
+    built = fractions["building"] + fractions["road"]
+    debris_ratio = fractions["debris"] / (fractions["debris"] + built + eps)
+    flood_ratio = fractions["water"] / (fractions["water"] + built + fractions["vegetation"] + eps)
+    fragmentation = 0.0
+    if building_components:
+        fragmentation = 1.0 / (1.0 + mean_building_pixels / INTACT_BUILDING_PIXELS)
+
+    score = 0.45 * debris_ratio + 0.35 * flood_ratio + 0.20 * fragmentation
+    return round(float(np.clip(score, 0.0, 1.0)) * 10, 2)
+
+
+def compute_mask_stats(mask: np.ndarray) -> dict:
+    """
+    Computes grouped class fractions, building component counts and the
+    heuristic damage score for a class-index mask.
+    """
+    per_class = class_fractions(mask)
+    fractions = {group: round(float(per_class[lut].sum()), 4) for group, lut in _GROUP_LUT.items()}
+
+    building_mask = _GROUP_LUT["building"][mask]
+    sizes = component_sizes(building_mask) if building_mask.any() else np.array([], dtype=np.int64)
+    mean_building_pixels = float(sizes.mean()) if sizes.size else 0.0
+
+    heuristic_score = damage_heuristic(fractions, int(sizes.size), mean_building_pixels)
+    top_classes = np.argsort(per_class)[::-1][:5]
+
+    return {
+        "class_fractions": fractions,
+        "top_classes": {int(c): round(float(per_class[c]), 4) for c in top_classes if per_class[c] > 0},
+        "building_components": int(sizes.size),
+        "mean_building_component_pixels": round(mean_building_pixels, 1),
+        "heuristic_damage_score": heuristic_score,
+        "needs_llm_review": AMBIGUOUS_LOW <= heuristic_score <= AMBIGUOUS_HIGH,
+    }
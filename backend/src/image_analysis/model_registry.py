@@ -0,0 +1,173 @@
+# src/image_analysis/model_registry.py
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from src.image_analysis.segmentation_model import segmentation_model
+from utils.memory import current_rss_mb
+from utils.metrics import span
+
+load_dotenv()
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the SegFormer model and its feature extractor.
+
+    The model is loaded once (normally in the background right after FastAPI
+    starts) and shared by every request afterwards. Loading is guarded by a
+    lock so concurrent first calls do not load the weights twice. torch is
+    only imported by `load`, which keeps importing this module cheap.
+    """
+
+    def __init__(self, quantize: bool = False, num_threads: int = None, warmup: bool = True, factory=None):
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.warmup = warmup
+        # Callable returning (model, extractor); segmentation_model when not set
+        self.factory = factory
+        self._model = None
+        self._extractor = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._loader = None
+        self._loading = False
+        self.load_error = None
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        """Builds a registry configured from SEGFORMER_* environment variables."""
+        num_threads = os.getenv("SEGFORMER_NUM_THREADS")
+        return cls(
+            quantize=_env_flag("SEGFORMER_QUANTIZE", False),
+            num_threads=int(num_threads) if num_threads else None,
+            warmup=_env_flag("SEGFORMER_WARMUP", True),
+        )
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def status(self) -> str:
+        """One of "idle", "loading", "ready" or "failed"."""
+        if self._model is not None:
+            return "ready"
+        if self._loading:
+            return "loading"
+        return "failed" if self.load_error else "idle"
+
+    def load_in_background(self) -> threading.Thread:
+        """Starts loading on a daemon thread so startup does not block on the weights."""
+        with self._lock:
+            if self._model is None and (self._loader is None or not self._loader.is_alive()):
+                self._loading = True
+                self._loader = threading.Thread(target=self._background_load, name="model-loader", daemon=True)
+                self._loader.start()
+            return self._loader
+
+    def _background_load(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"SegFormer model failed to load: {e}")
+
+    def load(self):
+        """Loads, optionally quantizes and warms up the model if not loaded yet."""
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is not None:
+                return
+            self._loading = True
+            try:
+                self._load()
+                self.load_error = None
+            except Exception as e:
+                self.load_error = str(e)
+                raise
+            finally:
+                self._loading = False
+
+        print(f"SegFormer model ready: {self._stats}")
+
+    def _load(self):
+        import torch
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+
+        with span("model_load"):
+            model, extractor = (self.factory or segmentation_model)()
+            model.eval()
+
+        quantized = False
+        # Dynamic quantization applies to the torch backend only
+        if self.quantize and isinstance(model, torch.nn.Module) and not torch.cuda.is_available():
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            quantized = True
+        load_seconds = time.perf_counter() - start
+
+        warmup_seconds = None
+        if self.warmup:
+            warmup_start = time.perf_counter()
+            self._run_warmup(model, extractor)
+            warmup_seconds = time.perf_counter() - warmup_start
+
+        self._stats = {
+            "model_name": getattr(model.config, "_name_or_path", "") or type(model).__name__,
+            "load_seconds": round(load_seconds, 3),
+            "warmup_seconds": round(warmup_seconds, 3) if warmup_seconds is not None else None,
+            "backend": "torch" if isinstance(model, torch.nn.Module) else type(model).__name__,
+            "quantized": quantized,
+            "num_threads": torch.get_num_threads(),
+            "rss_mb": round(current_rss_mb(), 1),
+            "model_rss_mb": round(current_rss_mb() - rss_before, 1),
+        }
+        self._extractor = extractor
+        self._model = model
+
+    def get(self):
+        """Returns the shared (model, extractor) pair, loading it on first use."""
+        self.load()
+        return self._model, self._extractor
+
+    def stats(self) -> dict:
+        """Returns load time and memory figures for the loaded model."""
+        stats = dict(self._stats)
+        stats["loaded"] = self.is_loaded
+        stats["status"] = self.status
+        stats["rss_mb"] = round(current_rss_mb(), 1)
+        return stats
+
+    @staticmethod
+    def _run_warmup(model, extractor):
+        import numpy as np
+        import torch
+        from PIL import Image
+
+        dummy = Image.fromarray(np.zeros((64, 64, 3), dtype=np.uint8))
+        inputs = extractor(images=[dummy], return_tensors="pt")
+        with torch.inference_mode():
+            model(**inputs)
+
+
+# Shared instance used by the API and the analysis tools
+model_registry = ModelRegistry.from_env()
+
+
+def get_segmentation_model():
+    """Returns the process-wide (model, extractor) pair."""
+    return model_registry.get()
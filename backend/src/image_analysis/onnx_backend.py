@@ -0,0 +1,131 @@
+# src/image_analysis/onnx_backend.py
+"""
+ONNX Runtime backend for SegFormer.
+
+Needs the optional `onnx` (export) and `onnxruntime` (inference) packages:
+
+    pip install onnx onnxruntime
+"""
+import os
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# === CONFIG ===
+# Exported graphs are kept here and reused by later starts and by every inference worker
+ONNX_DIR = os.getenv("SEGFORMER_ONNX_DIR", os.path.join(ROOT_DIR, "data", "onnx"))
+ONNX_OPSET = int(os.getenv("SEGFORMER_ONNX_OPSET", "17"))
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "The ONNX segmentation backend needs onnxruntime (and onnx to export): pip install onnx onnxruntime"
+        ) from e
+    return onnxruntime
+
+
+def onnx_path(model_name: str) -> str:
+    return os.path.join(ONNX_DIR, model_name.replace("/", "--") + ".onnx")
+
+
+def export_onnx(model, path: str, height: int, width: int, opset: int = ONNX_OPSET) -> str:
+    """
+    Exports a SegFormer model to ONNX with dynamic batch and image size.
+    The file is written next to its final path and renamed, so concurrent
+    workers never load a half-written graph.
+    """
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, pixel_values):
+            return self.wrapped(pixel_values=pixel_values).logits
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    staging = f"{path}.{os.getpid()}.tmp"
+    with torch.inference_mode():
+        torch.onnx.export(
+            LogitsOnly(model.eval()), (torch.zeros(1, 3, height, width),), staging,
+            input_names=["pixel_values"], output_names=["logits"],
+            dynamic_axes={
+                "pixel_values": {0: "batch", 2: "height", 3: "width"},
+                "logits": {0: "batch", 2: "mask_height", 3: "mask_width"},
+            },
+            opset_version=opset, dynamo=False,
+        )
+    os.replace(staging, path)
+    return path
+
+
+class OnnxSegformer:
+    """
+    Runs an exported SegFormer graph with ONNX Runtime on the CPU.
+
+    Behaves like the transformers model where the pipeline touches it:
+    `.config`, `.eval()` and `model(pixel_values=...)` returning an object
+    whose `.logits` is a torch tensor. All graph optimizations (constant
+    folding, node fusion, layout changes) are enabled; the session uses as
+    many intra-op threads as torch is configured for, so SEGFORMER_NUM_THREADS
+    and the inference pool's per-worker thread counts apply to it too.
+    """
+
+    def __init__(self, path: str, config, num_threads: int = None):
+        onnxruntime = _require_onnxruntime()
+        import torch
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.config = config
+
+    def eval(self):
+        return self
+
+    def __call__(self, pixel_values=None, **kwargs):
+        import torch
+
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.detach().cpu().numpy()
+        (logits,) = self.session.run(["logits"], {"pixel_values": pixel_values})
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    @classmethod
+    def from_torch(cls, model, extractor, path: str) -> "OnnxSegformer":
+        """Exports an already-loaded model (e.g. an untrained test model) and wraps it."""
+        size = extractor.size
+        export_onnx(model, path, size["height"], size["width"])
+        return cls(path, _onnx_config(model.config))
+
+
+def _onnx_config(config):
+    """A copy of the model config whose name marks the backend, so cached masks stay per backend."""
+    config = config.__class__.from_dict(config.to_dict())
+    config._name_or_path = f"{config._name_or_path or 'segformer'}:onnx"
+    return config
+
+
+def load_onnx_model(model_name: str):
+    """(OnnxSegformer, extractor) for a checkpoint, exporting it on first use."""
+    _require_onnxruntime()
+    from transformers import SegformerConfig, SegformerFeatureExtractor, SegformerForSemanticSegmentation
+
+    extractor = SegformerFeatureExtractor.from_pretrained(model_name)
+    path = onnx_path(model_name)
+    if not os.path.exists(path):
+        model = SegformerForSemanticSegmentation.from_pretrained(model_name)
+        export_onnx(model, path, extractor.size["height"], extractor.size["width"])
+        del model
+    return OnnxSegformer(path, _onnx_config(SegformerConfig.from_pretrained(model_name))), extractor
@@ -0,0 +1,118 @@
+# src/image_analysis/rendering.py
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === CONFIG ===
+RENDER_MODES = ("none", "mask", "overlay", "composite")
+RENDER_MODE = os.getenv("SEGMENTATION_RENDER_MODE", "mask")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+
+
+def _jet_lut() -> np.ndarray:
+    """256-entry RGB lookup table matching matplotlib's 'jet' colormap."""
+    x = np.linspace(0.0, 1.0, 256)
+    channels = [np.clip(1.5 - np.abs(4 * x - offset), 0.0, 1.0) for offset in (3, 2, 1)]
+    return (np.stack(channels, axis=1) * 255).astype(np.uint8)
+
+
+JET_LUT = _jet_lut()
+
+
+def apply_colormap(mask: np.ndarray) -> np.ndarray:
+    """Colorizes a class-index mask with the jet LUT, scaled by the highest class present."""
+    peak = max(int(mask.max()), 1)
+    indices = (mask.astype(np.uint16) * 255 // peak).astype(np.uint8)
+    return JET_LUT[indices]
+
+
+def resize_mask(mask: np.ndarray, size) -> Image.Image:
+    """Upsamples a model-resolution class mask to the image size without mixing class ids."""
+    return Image.fromarray(mask).resize(size, resample=Image.NEAREST)
+
+
+def save_mask(mask: np.ndarray, size, output_dir: str, filename_base: str) -> str:
+    """Writes the class-index mask as a single-channel PNG and returns its path."""
+    mask_path = os.path.join(output_dir, f"{filename_base}_mask.png")
+    resize_mask(mask, size).save(mask_path, optimize=True)
+    return mask_path
+
+
+def save_composite_figure(image, mask, overlay, output_dir, filename_base):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, axs = plt.subplots(1, 3, figsize=(15, 5))
+
+    axs[0].imshow(image)
+    axs[0].set_title("Original")
+    axs[0].axis('off')
+
+    axs[1].imshow(mask, cmap='jet')
+    axs[1].set_title("Mask")
+    axs[1].axis('off')
+
+    axs[2].imshow(overlay)
+    axs[2].set_title("Overlay")
+    axs[2].axis('off')
+
+    plt.tight_layout()
+    fig_path = os.path.join(output_dir, f"{filename_base}_composite.png")
+    plt.savefig(fig_path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def render_outputs(image_path: str, mask: np.ndarray, output_dir: str, filename_base: str, mode: str):
+    """Renders the overlay (and composite figure) for one image. Runs in a worker process."""
+    with Image.open(image_path) as source:
+        image = source.convert("RGB")
+    resized_mask = resize_mask(mask, image.size)
+
+    colored_mask = Image.fromarray(apply_colormap(np.asarray(resized_mask)))
+    overlay = Image.blend(image, colored_mask, alpha=0.5)
+    overlay.save(os.path.join(output_dir, f"{filename_base}_overlay.png"))
+
+    if mode == "composite":
+        save_composite_figure(image, resized_mask, overlay, output_dir, filename_base)
+
+
+class Renderer:
+    """
+    Background process pool for overlay and composite rendering, so drawing
+    never sits on the inference path. The pool is started on first use.
+    """
+
+    def __init__(self, max_workers: int = RENDER_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+
+    def submit(self, image_path, mask, output_dir, filename_base, mode):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        future = self._executor.submit(render_outputs, image_path, mask, output_dir, filename_base, mode)
+        future.add_done_callback(_report_failure)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def _report_failure(future):
+    if future.exception() is not None:
+        traceback.print_exception(future.exception())
+
+
+# Shared instance used by image_segmentation
+renderer = Renderer()
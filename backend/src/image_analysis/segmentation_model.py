@@ -1,7 +1,58 @@
-from transformers import SegformerFeatureExtractor, SegformerForSemanticSegmentation
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ADE20K checkpoints from smallest/fastest to largest/most accurate
+SEGFORMER_VARIANTS = {
+  "b0": "nvidia/segformer-b0-finetuned-ade-512-512",
+  "b1": "nvidia/segformer-b1-finetuned-ade-512-512",
+  "b2": "nvidia/segformer-b2-finetuned-ade-512-512",
+  "b3": "nvidia/segformer-b3-finetuned-ade-512-512",
+  "b4": "nvidia/segformer-b4-finetuned-ade-512-512",
+  "b5": "nvidia/segformer-b5-finetuned-ade-640-640",
+}
+SEGMENTATION_BACKENDS = ("torch", "onnx")
+
+# === CONFIG ===
+SEGFORMER_VARIANT = os.getenv("SEGFORMER_VARIANT", "b5").strip().lower()
+# "torch" runs the transformers model; "onnx" exports it once and runs it with ONNX Runtime
+SEGMENTATION_BACKEND = os.getenv("SEGMENTATION_BACKEND", "torch").strip().lower()
+# An explicit checkpoint overrides the variant
+MODEL_NAME = os.getenv("SEGFORMER_MODEL")
+if not MODEL_NAME:
+  if SEGFORMER_VARIANT not in SEGFORMER_VARIANTS:
+    raise ValueError(f"Unknown SEGFORMER_VARIANT '{SEGFORMER_VARIANT}', expected one of {tuple(SEGFORMER_VARIANTS)}")
+  MODEL_NAME = SEGFORMER_VARIANTS[SEGFORMER_VARIANT]
+
+
+def resolve_model_name(variant=None):
+  """Checkpoint for a variant name ("b0".."b5"); the configured model when None."""
+  if variant is None:
+    return MODEL_NAME
+  if variant.lower() not in SEGFORMER_VARIANTS:
+    raise ValueError(f"Unknown SegFormer variant '{variant}', expected one of {tuple(SEGFORMER_VARIANTS)}")
+  return SEGFORMER_VARIANTS[variant.lower()]
+
 
 # Load model
-def segmentation_model():
-  extractor = SegformerFeatureExtractor.from_pretrained("nvidia/segformer-b5-finetuned-ade-640-640")
-  model = SegformerForSemanticSegmentation.from_pretrained("nvidia/segformer-b5-finetuned-ade-640-640")
+def segmentation_model(variant=None, backend=None):
+  """
+  Returns (model, extractor) for a SegFormer variant on the chosen backend.
+  Both backends take `model(pixel_values=...)` and return `.logits`, so the
+  rest of the pipeline does not care which one runs.
+  """
+  model_name = resolve_model_name(variant)
+  backend = (backend or SEGMENTATION_BACKEND).lower()
+  if backend not in SEGMENTATION_BACKENDS:
+    raise ValueError(f"Unknown segmentation backend '{backend}', expected one of {SEGMENTATION_BACKENDS}")
+  if backend == "onnx":
+    from src.image_analysis.onnx_backend import load_onnx_model
+    return load_onnx_model(model_name)
+
+  # transformers pulls in torch, so it is only imported when the model is loaded
+  from transformers import SegformerFeatureExtractor, SegformerForSemanticSegmentation
+  extractor = SegformerFeatureExtractor.from_pretrained(model_name)
+  model = SegformerForSemanticSegmentation.from_pretrained(model_name)
   return (model, extractor)
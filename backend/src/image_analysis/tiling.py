@@ -0,0 +1,190 @@
+# src/image_analysis/tiling.py
+import math
+import os
+import tempfile
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from dotenv import load_dotenv
+
+from src.image_analysis.image_io import image_size, open_image
+from utils.metrics import span
+
+load_dotenv()
+
+# === CONFIG ===
+TILE_MODE = os.getenv("SEGMENTATION_TILE_MODE", "auto")  # "auto", "on" or "off"
+TILE_MIN_PIXELS = int(os.getenv("SEGMENTATION_TILE_MIN_PIXELS", str(4096 * 4096)))
+TILE_SIZE = os.getenv("SEGMENTATION_TILE_SIZE")
+TILE_OVERLAP = int(os.getenv("SEGMENTATION_TILE_OVERLAP", "128"))
+TILE_BATCH_SIZE = int(os.getenv("SEGMENTATION_TILE_BATCH_SIZE", "4"))
+# Rows copied from the decoded image into the scratch memmap at a time
+DECODE_BAND_ROWS = 512
+# SegFormer predicts logits at 1/4 of its input resolution
+OUTPUT_STRIDE = 4
+
+
+def is_large_image(image_path: str, min_pixels: int = TILE_MIN_PIXELS) -> bool:
+    """
+    Reads only the header to decide whether an image should be tiled.
+    Pillow's pixel limit does not apply here: the largest scenes are the
+    ones that most need tiling, and anything above the limit is tiled since
+    the untiled path opens images with plain Image.open.
+    """
+    width, height = image_size(image_path)
+    pixel_limit = Image.MAX_IMAGE_PIXELS
+    return width * height >= min_pixels or (pixel_limit is not None and width * height > pixel_limit)
+
+
+def should_tile(image_path: str, tile_mode: str = TILE_MODE) -> bool:
+    if tile_mode == "on":
+        return True
+    if tile_mode == "off":
+        return False
+    return is_large_image(image_path)
+
+
+def open_pixels(image_path: str, scratch_dir: str = None) -> np.ndarray:
+    """
+    Returns an (H, W, 3) uint8 array backed by disk rather than the heap.
+
+    Uncompressed RGB files (raw TIFF, BMP, PPM) are memory-mapped in place.
+    Compressed formats have to be decoded once; the pixels are then copied
+    into a memory-mapped scratch file band by band (converting each band to
+    RGB if needed), so the only full-size heap copy is PIL's own decode buffer
+    and tiles are paged in on demand.
+    """
+    image = open_image(image_path)
+    width, height = image.size
+    if image.mode == "RGB" and len(image.tile) == 1:
+        decoder, extents, offset, args = image.tile[0]
+        rawmode = args[0] if isinstance(args, tuple) else args
+        stride = args[1] if isinstance(args, tuple) and len(args) > 1 else 0
+        if decoder == "raw" and rawmode == "RGB" and stride in (0, width * 3) and extents == (0, 0, width, height):
+            image.close()
+            return np.memmap(image_path, dtype=np.uint8, mode="r", offset=offset, shape=(height, width, 3))
+
+    fd, scratch_path = tempfile.mkstemp(suffix=".npy", dir=scratch_dir)
+    os.close(fd)
+    pixels = np.lib.format.open_memmap(scratch_path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+    with image:
+        image.load()
+        for top in range(0, height, DECODE_BAND_ROWS):
+            bottom = min(top + DECODE_BAND_ROWS, height)
+            band = image.crop((0, top, width, bottom))
+            if band.mode != "RGB":
+                band = band.convert("RGB")
+            pixels[top:bottom] = np.asarray(band)
+    pixels.flush()
+    # The file stays readable through the mapping after it is unlinked
+    os.unlink(scratch_path)
+    return pixels
+
+
+def tile_positions(length: int, tile: int, stride: int) -> list:
+    """Tile start offsets (multiples of OUTPUT_STRIDE) covering [0, length)."""
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile, stride))
+    last = ((length - tile) // OUTPUT_STRIDE) * OUTPUT_STRIDE
+    if not positions or positions[-1] != last:
+        positions.append(last)
+    return positions
+
+
+def _blend_window(height: int, width: int, ramp: int) -> np.ndarray:
+    """Weights that fall off linearly over `ramp` pixels at each tile edge."""
+    ramp = max(ramp, 1)
+    rows = np.minimum(np.arange(height) + 1, np.arange(height)[::-1] + 1) / ramp
+    cols = np.minimum(np.arange(width) + 1, np.arange(width)[::-1] + 1) / ramp
+    return np.clip(np.minimum.outer(rows, cols), 1e-3, 1.0).astype(np.float32)
+
+
+def _tile_logits(model, extractor, tiles: list, out_sizes: list) -> list:
+    """Runs a batch of tiles and returns logits resized to each tile's 1/4 grid."""
+    with span("preprocessing"):
+        inputs = extractor(images=[Image.fromarray(np.ascontiguousarray(t)) for t in tiles], return_tensors="pt")
+    with span("inference"), torch.inference_mode():
+        logits = model(**inputs).logits
+        return [
+            F.interpolate(logits[i:i + 1], size=size, mode="bilinear", align_corners=False)[0].numpy()
+            for i, size in enumerate(out_sizes)
+        ]
+
+
+def segment_tiled(image_path: str, model, extractor, mask_path: str, tile_size: int = None,
+                  overlap: int = TILE_OVERLAP, batch_size: int = TILE_BATCH_SIZE):
+    """
+    Segments a large image tile by tile and writes the native-resolution mask
+    to `mask_path` (a .npy file) incrementally.
+
+    Tiles overlap by `overlap` pixels and their logits are blended with a
+    linear edge ramp to hide seams. Logits are accumulated at SegFormer's
+    1/4 output resolution for one row of tiles at a time; as soon as a row is
+    complete, the rows no later tile can touch are argmax-ed, upsampled and
+    flushed to disk. Memory therefore scales with the tile size and image
+    width, never with the full image area.
+
+    Returns the (H/4, W/4) label grid, which is small enough for mask statistics.
+    """
+    if tile_size is None:
+        size = extractor.size if isinstance(extractor.size, dict) else {"height": extractor.size}
+        tile_size = int(TILE_SIZE or size.get("height", 640))
+    tile_size -= tile_size % OUTPUT_STRIDE
+    # Tiles must advance by at least half their size
+    overlap = min(overlap, tile_size // 2)
+    overlap -= overlap % OUTPUT_STRIDE
+    stride = tile_size - overlap
+
+    pixels = open_pixels(image_path, scratch_dir=os.path.dirname(mask_path) or None)
+    height, width = pixels.shape[:2]
+    small_h, small_w = math.ceil(height / OUTPUT_STRIDE), math.ceil(width / OUTPUT_STRIDE)
+    num_labels = model.config.num_labels
+
+    mask = np.lib.format.open_memmap(mask_path, mode="w+", dtype=np.uint8, shape=(height, width))
+    grid = np.zeros((small_h, small_w), dtype=np.uint8)
+
+    ys = tile_positions(height, tile_size, stride)
+    xs = tile_positions(width, tile_size, stride)
+    band_rows = math.ceil((tile_size + OUTPUT_STRIDE) / OUTPUT_STRIDE)
+    band = np.zeros((num_labels, band_rows, small_w), dtype=np.float32)
+
+    for row, y0 in enumerate(ys):
+        y1 = height if row == len(ys) - 1 else min(y0 + tile_size, height)
+        sy0 = y0 // OUTPUT_STRIDE
+        sh = math.ceil(y1 / OUTPUT_STRIDE) - sy0
+
+        # Gather this row's tiles and run them in batches
+        boxes = []
+        for col, x0 in enumerate(xs):
+            x1 = width if col == len(xs) - 1 else min(x0 + tile_size, width)
+            sx0 = x0 // OUTPUT_STRIDE
+            boxes.append((x0, x1, sx0, math.ceil(x1 / OUTPUT_STRIDE) - sx0))
+
+        for start in range(0, len(boxes), batch_size):
+            batch = boxes[start:start + batch_size]
+            tiles = [pixels[y0:y1, x0:x1] for x0, x1, _, _ in batch]
+            logits = _tile_logits(model, extractor, tiles, [(sh, sw) for _, _, _, sw in batch])
+            for (x0, x1, sx0, sw), tile_logits in zip(batch, logits):
+                band[:, :sh, sx0:sx0 + sw] += tile_logits * _blend_window(sh, sw, overlap // OUTPUT_STRIDE)
+
+        # Rows above the next tile row's start are final
+        final_end = ys[row + 1] // OUTPUT_STRIDE if row + 1 < len(ys) else small_h
+        final_rows = final_end - sy0
+        labels = band[:, :final_rows].argmax(axis=0).astype(np.uint8)
+        grid[sy0:final_end] = labels
+
+        native_y1 = min(final_end * OUTPUT_STRIDE, height)
+        native = np.repeat(np.repeat(labels, OUTPUT_STRIDE, axis=0), OUTPUT_STRIDE, axis=1)
+        mask[y0:native_y1] = native[:native_y1 - y0, :width]
+
+        # Carry the overlapping rows into the next band
+        carried = band[:, final_rows:].copy()
+        band.fill(0)
+        band[:, :carried.shape[1]] = carried
+
+    mask.flush()
+    del mask, pixels
+    return grid
@@ -0,0 +1,236 @@
+# src/pipeline/batch.py
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "32"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "1"))
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+class BatchJournal:
+    """
+    Append-only JSONL checkpoint of a batch run.
+
+    Every scored image is written as one {"type": "image", ...} line and
+    flushed straight away, so a crash loses at most the chunks in flight.
+    Failed chunks are recorded as {"type": "error"} lines and retried on the
+    next run; per-folder evaluator decisions are {"type": "decision"} lines.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed = {}
+        self.decisions = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; its images are simply redone
+                    continue
+                if record.get("type") == "image":
+                    self.completed[record["image_path"]] = record
+                elif record.get("type") == "decision":
+                    self.decisions[record["folder"]] = record
+
+    def is_done(self, image_path: str) -> bool:
+        return image_path in self.completed
+
+    def results_for(self, folder: str) -> list:
+        return [record for record in self.completed.values() if record["folder"] == folder]
+
+    def append(self, records: list):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            for record in records:
+                if record["type"] == "image":
+                    self.completed[record["image_path"]] = record
+                elif record["type"] == "decision":
+                    self.decisions[record["folder"]] = record
+
+
+class ProgressReporter:
+    """Prints done/total, throughput and ETA at most every `interval` seconds."""
+
+    def __init__(self, total: int, interval: float = 10.0, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def advance(self, done: int = 0, failed: int = 0):
+        with self._lock:
+            self.done += done
+            self.failed += failed
+            now = time.perf_counter()
+            if now - self._last_report >= self.interval:
+                self._last_report = now
+                self.report()
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = self.total - self.done - self.failed
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "total": self.total,
+            "seconds": round(elapsed, 1),
+            "images_per_second": round(rate, 2),
+            "eta_seconds": round(remaining / rate) if rate else None,
+        }
+
+    def report(self):
+        s = self.summary()
+        percent = 100.0 * (s["done"] + s["failed"]) / s["total"] if s["total"] else 100.0
+        eta = time.strftime("%H:%M:%S", time.gmtime(s["eta_seconds"])) if s["eta_seconds"] is not None else "--:--:--"
+        print(
+            f"[batch] {s['done']}/{s['total']} images ({percent:.1f}%), {s['failed']} failed | "
+            f"{s['images_per_second']:.2f} img/s | ETA {eta}",
+            file=self.stream, flush=True,
+        )
+
+
+def read_manifest(path: str) -> list:
+    """
+    Folders listed in a manifest: one path per line (blank lines and `#`
+    comments ignored), or JSON lines with a "folder" key.
+    """
+    folders = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            folders.append(json.loads(line)["folder"] if line.startswith("{") else line)
+    return folders
+
+
+def list_images(folder: str) -> list:
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def run_batch(folders: list, journal: BatchJournal, workers: int = BATCH_WORKERS, chunk_size: int = BATCH_CHUNK_SIZE,
+              evaluate: bool = False, log_interval: float = 10.0, analyze=None, evaluate_folder=None) -> dict:
+    """
+    Analyzes every image under `folders`, skipping those already in `journal`.
+
+    Pending images are split into chunks of `chunk_size`, and `workers`
+    chunks run at once through the regular analysis pipeline; each finished
+    chunk is checkpointed before its progress is reported. With `evaluate`,
+    each folder whose images are all done also gets an evaluator decision.
+    Returns a summary with counts and throughput.
+    """
+    if analyze is None:
+        from src.tools.image_analysis_tool import full_damage_analysis as analyze
+    if evaluate and evaluate_folder is None:
+        from main import evaluate_analysis
+
+        def evaluate_folder(results):
+            return evaluate_analysis(results)["evaluator_decision"]
+
+    folders = list(dict.fromkeys(folders))
+    pending = {}
+    skipped = 0
+    for folder in folders:
+        for image_path in list_images(folder):
+            if journal.is_done(image_path):
+                skipped += 1
+            else:
+                pending.setdefault(folder, []).append(image_path)
+    total = sum(len(paths) for paths in pending.values())
+    print(f"[batch] {len(folders)} folders, {total} images to analyze, {skipped} already in the journal",
+          file=sys.stderr, flush=True)
+
+    reporter = ProgressReporter(total, interval=log_interval)
+    chunks = [(folder, chunk) for folder, paths in pending.items() for chunk in _chunks(paths, max(1, chunk_size))]
+
+    def run_chunk(folder, image_paths):
+        results = analyze(folder, image_paths=image_paths)
+        now = time.time()
+        journal.append([
+            {
+                "type": "image",
+                "folder": folder,
+                "image_path": item["image_path"],
+                "damage_score": item["damage_score"],
+                "damage_explanation": item["damage_explanation"],
+                "heuristic_damage_score": item.get("heuristic_damage_score"),
+                "mask_stats": item.get("mask_stats"),
+                "completed_at": now,
+            }
+            for item in results
+        ])
+        return len(results)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(run_chunk, folder, chunk): (folder, chunk) for folder, chunk in chunks}
+        for future in as_completed(futures):
+            folder, chunk = futures[future]
+            try:
+                reporter.advance(done=future.result())
+            except Exception as e:
+                journal.append([{
+                    "type": "error",
+                    "folder": folder,
+                    "image_paths": chunk,
+                    "error": str(e),
+                    "failed_at": time.time(),
+                }])
+                reporter.advance(failed=len(chunk))
+                print(f"[batch] chunk of {len(chunk)} images in {folder} failed: {e}",
+                      file=sys.stderr, flush=True)
+    reporter.report()
+
+    decisions = 0
+    if evaluate:
+        for folder in folders:
+            if folder in journal.decisions and folder not in pending:
+                continue
+            if any(not journal.is_done(path) for path in list_images(folder)):
+                # Incomplete folders are evaluated on the run that finishes them
+                continue
+            results = journal.results_for(folder)
+            if not results:
+                continue
+            try:
+                decision = evaluate_folder(results)
+            except Exception as e:
+                print(f"[batch] evaluation of {folder} failed: {e}", file=sys.stderr, flush=True)
+                continue
+            journal.append([{"type": "decision", "folder": folder, "decision": decision, "completed_at": time.time()}])
+            decisions += 1
+
+    return {**reporter.summary(), "skipped": skipped, "folders": len(folders), "decisions": decisions}
@@ -0,0 +1,137 @@
+# src/pipeline/evaluator.py
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, Field
+
+from utils.metrics import span, llm_callbacks, LLM_REQUESTS
+
+# === CONFIG ===
+# Only the best locally ranked images reach the LLM, however large the folder
+EVALUATOR_CANDIDATES = int(os.getenv("EVALUATOR_CANDIDATES", "32"))
+EVALUATOR_SHARD_SIZE = int(os.getenv("EVALUATOR_SHARD_SIZE", "8"))
+EVALUATOR_CONCURRENCY = int(os.getenv("EVALUATOR_CONCURRENCY", "4"))
+EXPLANATION_CHARS = 300
+
+
+class EvaluatorDecision(BaseModel):
+    area_name: str = Field(..., description="Name of the area selected")
+    damage_score: float = Field(..., description="Damage score (potentially refined based on web context)", ge=0, le=10)
+    original_explanation: str = Field(..., description="Original explanation")
+    justification: str = Field(..., description="Justification for the choice, incorporating insights from the area name and web context")
+    image_path: str = Field(..., description="Original image path (for reference, not for display in final output)")
+
+
+class CandidateChoice(BaseModel):
+    candidate_id: int = Field(..., description="The id of the most urgent candidate")
+    area_name: str = Field(..., description="Name of the area of the selected candidate")
+    damage_score: float = Field(..., description="Damage score (potentially refined based on web context)", ge=0, le=10)
+    justification: str = Field(..., description="Justification for the choice, incorporating insights from the area name and web context")
+
+
+def rank_locally(results: list) -> list:
+    """Orders results by damage score, breaking ties with the mask heuristic."""
+    return sorted(
+        results,
+        key=lambda item: (item["damage_score"], item.get("heuristic_damage_score") or 0),
+        reverse=True,
+    )
+
+
+def _shard_prompt(candidates: list, final: bool) -> str:
+    """Compact JSON for one shard; shared area descriptions are listed once."""
+    areas = list(dict.fromkeys(item["area_name"] for _, item in candidates))
+    payload = {
+        "areas": dict(enumerate(areas)),
+        "candidates": [
+            {
+                "id": candidate_id,
+                "image": os.path.basename(item["image_path"]),
+                "score": item["damage_score"],
+                "explanation": item["damage_explanation"][:EXPLANATION_CHARS],
+                "area": areas.index(item["area_name"]),
+            }
+            for candidate_id, item in candidates
+        ],
+    }
+    instruction = (
+        "Use the area to enrich your understanding and refine the damage assessment, damage score, and justification."
+        if final else
+        "Keep the justification to one sentence."
+    )
+    return f"""You are a disaster evaluator.
+Below are image analyses with damage scores (0 to 10), explanations, and ids into a table of area names.
+Choose which candidate represents the **most urgent situation** based on the information provided.
+{instruction}
+
+{json.dumps(payload, separators=(",", ":"))}
+"""
+
+
+def _choose(llm, candidates: list, final: bool) -> tuple:
+    """Asks the LLM for the most urgent of `candidates`; returns (candidate_id, choice or None)."""
+    model = llm.with_structured_output(CandidateChoice)
+    ids = {candidate_id for candidate_id, _ in candidates}
+    LLM_REQUESTS.inc(model=llm.model, purpose="evaluation")
+    try:
+        with span("evaluation", round="final" if final else "shard"):
+            choice = model.invoke(
+                [HumanMessage(content=_shard_prompt(candidates, final))],
+                config={"callbacks": llm_callbacks(llm.model)},
+            )
+    except Exception:
+        if final:
+            raise
+        choice = None
+    if choice is None or choice.candidate_id not in ids:
+        # Candidates are locally ranked, so the first one is the best fallback
+        return candidates[0][0], None
+    return choice.candidate_id, choice
+
+
+def evaluate_most_urgent(results: list, llm, candidates: int = EVALUATOR_CANDIDATES,
+                         shard_size: int = EVALUATOR_SHARD_SIZE) -> EvaluatorDecision:
+    """
+    Picks the most urgent image with a tournament of small LLM calls.
+
+    Results are pre-ranked locally and only the top `candidates` are kept.
+    They are split into shards of `shard_size` that are judged in parallel;
+    the winners go through further rounds until one shard remains, whose
+    winner becomes the EvaluatorDecision. Prompt size is bounded by the shard
+    size and the number of calls by the candidate count, so cost no longer
+    grows with the folder.
+    """
+    if not results:
+        raise ValueError("No analysis results to evaluate")
+
+    shard_size = max(2, shard_size)
+    ranked = rank_locally(results)[:max(1, candidates)]
+    contenders = list(enumerate(ranked))
+
+    with ThreadPoolExecutor(max_workers=EVALUATOR_CONCURRENCY) as executor:
+        while len(contenders) > shard_size:
+            shards = [contenders[i:i + shard_size] for i in range(0, len(contenders), shard_size)]
+            winners = executor.map(lambda shard: _choose(llm, shard, final=False)[0], shards)
+            by_id = dict(contenders)
+            contenders = [(winner, by_id[winner]) for winner in winners]
+
+    winner_id, choice = _choose(llm, contenders, final=True)
+    winner = dict(contenders)[winner_id]
+    if choice is None:
+        # The LLM named no known candidate, so its refinement cannot be trusted; keep the local assessment
+        return EvaluatorDecision(
+            area_name=winner["area_name"],
+            damage_score=winner["damage_score"],
+            original_explanation=winner["damage_explanation"],
+            justification="Highest locally ranked damage score; the evaluator's choice did not match any candidate.",
+            image_path=winner["image_path"],
+        )
+    return EvaluatorDecision(
+        area_name=choice.area_name,
+        damage_score=choice.damage_score,
+        original_explanation=winner["damage_explanation"],
+        justification=choice.justification,
+        image_path=winner["image_path"],
+    )
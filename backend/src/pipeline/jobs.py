@@ -0,0 +1,130 @@
+# src/pipeline/jobs.py
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "1000"))
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class Job:
+    """State and progress events of one background analysis job."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def emit(self, event: str, **data):
+        """Records a progress event; used as the `progress` callback of job functions."""
+        with self._condition:
+            self.events.append({"event": event, "time": time.time(), **data})
+            self._condition.notify_all()
+
+    def finish(self, status: str, result=None, error: str = None):
+        """
+        Records the outcome and its final status event in one step, so a
+        reader that sees the job finished also sees every event.
+        """
+        with self._condition:
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.events.append({"event": "status", "time": self.finished_at, "status": status, "error": error})
+            self.status = status
+            self._condition.notify_all()
+
+    def events_since(self, cursor: int, timeout: float = None) -> list:
+        """Returns events after `cursor`, waiting up to `timeout` seconds for new ones."""
+        with self._condition:
+            if timeout and len(self.events) <= cursor and not self.finished:
+                self._condition.wait(timeout)
+            return self.events[cursor:]
+
+    def snapshot(self, include_events: bool = False) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+        if include_events:
+            data["events"] = list(self.events)
+        return data
+
+
+class JobManager:
+    """
+    Runs blocking analysis work on a worker pool so the API event loop stays free.
+
+    `submit` returns immediately with a Job; the function is called on a worker
+    thread with a `progress` keyword argument that records events on the job.
+    Only the most recent `retention` jobs are kept in memory.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, retention: int = JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Job:
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.emit("status", status=job.status)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: Job, fn, args, kwargs):
+        job.started_at = time.time()
+        job.status = "running"
+        job.emit("status", status=job.status)
+        try:
+            result = fn(*args, progress=job.emit, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            job.finish("failed", error=str(e))
+        else:
+            job.finish("completed", result=result)
+
+    def _prune(self):
+        # Drop the oldest finished jobs once the retention limit is exceeded
+        overflow = len(self._jobs) - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(0, overflow)]:
+            del self._jobs[job_id]
+
+
+# Shared instance used by the API
+job_manager = JobManager()
@@ -0,0 +1,156 @@
+# src/pipeline/priority_index.py
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+PRIORITY_INDEX_PATH = os.getenv("PRIORITY_INDEX_PATH", os.path.join(ROOT_DIR, "data", "priority.sqlite"))
+PRIORITY_PAGE_SIZE = int(os.getenv("PRIORITY_PAGE_SIZE", "50"))
+PRIORITY_MAX_PAGE_SIZE = 500
+
+COLUMNS = (
+    "user_id", "folder_path", "image_name", "image_path", "damage_score", "refined_damage_score",
+    "priority_score", "heuristic_damage_score", "area_name", "damage_explanation", "justification",
+    "analyzed_at", "duplicate_of",
+)
+# Most urgent first; ties are grouped by area and the newest analysis wins
+ORDER_BY = "priority_score DESC, area_name ASC, analyzed_at DESC"
+
+
+class PriorityIndex:
+    """
+    Persistent ranking of every analyzed image across folders and users.
+
+    One row is kept per (user_id, folder_path, image_name). Each finished
+    analysis upserts only its own folder's rows, so the ranking grows
+    incrementally and older folders are never re-analyzed. The priority score
+    is the evaluator's refined damage score where there is one, otherwise
+    the per-image damage score.
+    """
+
+    def __init__(self, path: str = PRIORITY_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS sites (
+                    user_id TEXT NOT NULL,
+                    folder_path TEXT NOT NULL,
+                    image_name TEXT NOT NULL,
+                    image_path TEXT NOT NULL,
+                    damage_score REAL NOT NULL,
+                    refined_damage_score REAL,
+                    priority_score REAL NOT NULL,
+                    heuristic_damage_score REAL,
+                    area_name TEXT NOT NULL,
+                    damage_explanation TEXT NOT NULL,
+                    justification TEXT,
+                    analyzed_at REAL NOT NULL,
+                    duplicate_of TEXT,
+                    PRIMARY KEY (user_id, folder_path, image_name)
+                )"""
+            )
+            # Indexes created before near-duplicate marking lack the column
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(sites)")}
+            if "duplicate_of" not in existing:
+                self._conn.execute("ALTER TABLE sites ADD COLUMN duplicate_of TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sites_user_priority ON sites "
+                "(user_id, priority_score DESC, area_name, analyzed_at DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sites_priority ON sites (priority_score DESC, area_name, analyzed_at DESC)"
+            )
+        return self._conn
+
+    def update(self, user_id: str, folder_path: str, detailed_analysis: list, decision: dict = None) -> int:
+        """
+        Upserts the results of one folder analysis. `decision` is the
+        evaluator's choice; its refined score replaces the chosen image's
+        damage score in the ranking. Returns the number of rows written.
+        """
+        now = time.time()
+        chosen_path = decision.get("image_path") if decision else None
+        rows = []
+        for item in detailed_analysis:
+            refined = None
+            justification = None
+            if item["image_path"] == chosen_path:
+                refined = decision["damage_score"]
+                justification = decision.get("justification")
+            rows.append((
+                user_id,
+                folder_path,
+                os.path.basename(item["image_path"]),
+                item["image_path"],
+                item["damage_score"],
+                refined,
+                refined if refined is not None else item["damage_score"],
+                item.get("heuristic_damage_score"),
+                item.get("area_name") or "",
+                item["damage_explanation"],
+                justification,
+                now,
+                item.get("duplicate_of"),
+            ))
+
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO sites ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+            conn.commit()
+        return len(rows)
+
+    def top(self, user_id: str = None, k: int = 10) -> list:
+        """Returns the `k` most urgent sites, for one user or across all users."""
+        return self._query(user_id, limit=k, offset=0)
+
+    def page(self, user_id: str = None, page: int = 1, page_size: int = PRIORITY_PAGE_SIZE) -> dict:
+        """Returns one page of the ranking plus the total number of sites."""
+        page = max(1, page)
+        page_size = max(1, min(page_size, PRIORITY_MAX_PAGE_SIZE))
+        where, params = self._where(user_id)
+        with self._lock:
+            (total,) = self._connection().execute(f"SELECT COUNT(*) FROM sites {where}", params).fetchone()
+        return {
+            "user_id": user_id,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "items": self._query(user_id, limit=page_size, offset=(page - 1) * page_size),
+        }
+
+    def _query(self, user_id, limit: int, offset: int) -> list:
+        where, params = self._where(user_id)
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT {', '.join(COLUMNS)} FROM sites {where} ORDER BY {ORDER_BY} LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [{**dict(row), "rank": offset + i + 1} for i, row in enumerate(rows)]
+
+    @staticmethod
+    def _where(user_id) -> tuple:
+        if user_id is None:
+            return "", ()
+        return "WHERE user_id = ?", (user_id,)
+
+
+# Shared instance used by the API
+priority_index = PriorityIndex()
@@ -0,0 +1,505 @@
+# src/pipeline/result_store.py
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.join(ROOT_DIR, "data", "results"))
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Keep the predicted class mask of every image next to its record
+RESULT_STORE_MASKS = os.getenv("RESULT_STORE_MASKS", "true").strip().lower() in ("1", "true", "yes", "on")
+# Segments smaller than this are merged by compact()
+RESULT_STORE_SEGMENT_ROWS = int(os.getenv("RESULT_STORE_SEGMENT_ROWS", "50000"))
+RESULT_QUERY_LIMIT = 1000
+# Times a query rescans after compaction removed a segment underneath it
+SCAN_ATTEMPTS = 3
+
+# Fixed-width columns, one .npy file each, memory-mapped when queried
+NUMERIC_COLUMNS = {
+    "damage_score": np.float32,
+    "refined_damage_score": np.float32,
+    "heuristic_damage_score": np.float32,
+    "building_fraction": np.float32,
+    "road_fraction": np.float32,
+    "water_fraction": np.float32,
+    "debris_fraction": np.float32,
+    "building_components": np.int32,
+    "analyzed_at": np.float64,
+}
+# Low-cardinality strings, stored as int32 codes into a per-segment dictionary
+CATEGORY_COLUMNS = ("user_id", "folder_path", "event", "area_name")
+# Free text, gzipped JSON lines; only decompressed when a query asks for one of them
+TEXT_COLUMNS = ("image_name", "image_path", "damage_explanation", "justification", "mask_stats", "duplicate_of")
+COLUMNS = (*CATEGORY_COLUMNS, *TEXT_COLUMNS, *NUMERIC_COLUMNS)
+
+
+def _timestamp(value) -> float:
+    """Accepts epoch seconds or an ISO date/datetime string."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class ResultStore:
+    """
+    Append-only, columnar store of every per-image analysis result.
+
+    Each append (normally one analyzed folder) becomes an immutable segment
+    directory: numeric columns as .npy files, low-cardinality strings
+    dictionary-encoded, free text gzipped, and the class masks in one
+    compressed .npz. A segment is written to a temporary directory and
+    renamed into place, so readers never see a partial one.
+
+    Queries first skip whole segments using the event, user, score and date
+    ranges recorded in each segment's metadata, then filter the remaining
+    rows on memory-mapped columns. Only the matching rows of the requested
+    columns are materialized, so analytics over months of results touch a
+    fraction of the data.
+    """
+
+    def __init__(self, path: str = RESULT_STORE_PATH, keep_masks: bool = RESULT_STORE_MASKS):
+        self.path = path
+        self.keep_masks = keep_masks
+        self.segments_dir = os.path.join(path, "segments")
+        self._lock = threading.Lock()
+        # Segments never change once committed, so their metadata is read once
+        self._metas = {}
+
+    # --- writing ---
+
+    def append(self, user_id: str, folder_path: str, detailed_analysis: list, decision: dict = None) -> str:
+        """
+        Writes the results of one folder analysis as a new segment and returns
+        its id. `decision` is the evaluator's choice; the chosen image gets its
+        refined score and justification. Results may carry a "mask" array.
+        """
+        if not detailed_analysis:
+            return None
+
+        now = time.time()
+        chosen_path = decision.get("image_path") if decision else None
+        records = []
+        for item in detailed_analysis:
+            chosen = item["image_path"] == chosen_path
+            records.append({
+                **item,
+                "user_id": user_id,
+                "folder_path": folder_path,
+                "event": item.get("event") or "Unknown Event",
+                "image_name": os.path.basename(item["image_path"]),
+                "refined_damage_score": decision["damage_score"] if chosen else None,
+                "justification": decision.get("justification") if chosen else None,
+                "analyzed_at": item.get("analyzed_at", now),
+            })
+        return self._write_segment(records)
+
+    def _write_segment(self, records: list, created: str = None) -> str:
+        numbers = {
+            name: np.array([_numeric(record, name) for record in records], dtype=dtype)
+            for name, dtype in NUMERIC_COLUMNS.items()
+        }
+        categories = {}
+        for name in CATEGORY_COLUMNS:
+            values = [record.get(name) or "" for record in records]
+            dictionary = list(dict.fromkeys(values))
+            lookup = {value: code for code, value in enumerate(dictionary)}
+            categories[name] = (np.array([lookup[v] for v in values], dtype=np.int32), dictionary)
+
+        def write_text(f):
+            for record in records:
+                f.write(json.dumps([record.get(name) for name in TEXT_COLUMNS]) + "\n")
+
+        masks = ((i, record["mask"]) for i, record in enumerate(records) if record.get("mask") is not None)
+        return self._commit_segment(len(records), numbers, categories, write_text, masks, created)
+
+    def _commit_segment(self, rows: int, numbers: dict, categories: dict, write_text, masks,
+                        created: str = None, replaces: list = None) -> str:
+        """
+        Writes a segment from its columns into a staging directory and renames
+        it into place. `categories` maps each column to (codes, dictionary),
+        `write_text(f)` writes the text lines and `masks` yields (row, mask)
+        pairs, which are written one at a time. `replaces` lists segments the
+        new one supersedes; readers stop seeing them as soon as it is committed.
+        """
+        # Ids sort in commit order; `created` keeps a merged segment in its predecessors' place
+        created = created or _commit_stamp()
+        segment_id = f"{created}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.segments_dir, exist_ok=True)
+        staging = os.path.join(self.segments_dir, f".tmp-{segment_id}")
+        os.makedirs(staging)
+
+        for name, values in numbers.items():
+            np.save(os.path.join(staging, f"{name}.npy"), values)
+        for name, (codes, _) in categories.items():
+            np.save(os.path.join(staging, f"{name}.npy"), codes)
+        with gzip.open(os.path.join(staging, "text.jsonl.gz"), "wt") as f:
+            write_text(f)
+        has_masks = self.keep_masks and _write_masks(os.path.join(staging, "masks.npz"), masks) > 0
+
+        scores, analyzed_at = numbers["damage_score"], numbers["analyzed_at"]
+        scored = scores[np.isfinite(scores)]
+        meta = {
+            "rows": rows,
+            "created_at": time.time(),
+            "dictionaries": {name: dictionary for name, (_, dictionary) in categories.items()},
+            # null when no row has a score, since NaN is not valid JSON
+            "min_damage_score": float(scored.min()) if scored.size else None,
+            "max_damage_score": float(scored.max()) if scored.size else None,
+            "min_analyzed_at": float(analyzed_at.min()),
+            "max_analyzed_at": float(analyzed_at.max()),
+            "masks": has_masks,
+        }
+        if replaces:
+            meta["replaces"] = list(replaces)
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        os.rename(staging, os.path.join(self.segments_dir, segment_id))
+        return segment_id
+
+    # --- reading ---
+
+    def segments(self) -> list:
+        """Ids of the committed segments, oldest first, without those a merged segment replaces."""
+        live, _ = self._listing()
+        return live
+
+    def _listing(self) -> tuple:
+        """(live segment ids, ids replaced by a committed merge but possibly still on disk)."""
+        if not os.path.isdir(self.segments_dir):
+            return [], set()
+        committed, replaced = [], set()
+        for name in sorted(os.listdir(self.segments_dir)):
+            if name.startswith("."):
+                continue
+            try:
+                replaced.update(self._meta(name).get("replaces", ()))
+            except FileNotFoundError:
+                continue  # deleted by compact() while listing
+            committed.append(name)
+        for stale in set(self._metas) - set(committed):
+            self._metas.pop(stale, None)
+        return [name for name in committed if name not in replaced], replaced
+
+    def _meta(self, segment_id: str) -> dict:
+        meta = self._metas.get(segment_id)
+        if meta is None:
+            with open(os.path.join(self.segments_dir, segment_id, "meta.json")) as f:
+                meta = self._metas[segment_id] = json.load(f)
+        return meta
+
+    def _column(self, segment_id: str, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.segments_dir, segment_id, f"{name}.npy"), mmap_mode="r")
+
+    def _text(self, segment_id: str, rows: np.ndarray) -> dict:
+        wanted = set(rows.tolist())
+        values = {name: [] for name in TEXT_COLUMNS}
+        with gzip.open(os.path.join(self.segments_dir, segment_id, "text.jsonl.gz"), "rt") as f:
+            for i, line in enumerate(f):
+                if i in wanted:
+                    row = json.loads(line)
+                    # Segments written before a column was added have shorter lines
+                    row += [None] * (len(TEXT_COLUMNS) - len(row))
+                    for name, value in zip(TEXT_COLUMNS, row):
+                        values[name].append(value)
+        return values
+
+    @staticmethod
+    def _prunable(meta: dict, event, user_id, min_score, max_score, since, until) -> bool:
+        """True when no row of the segment can match, judged from its metadata alone."""
+        dictionaries = meta["dictionaries"]
+        # A segment without any score matches no score filter
+        unscored = meta["min_damage_score"] is None
+        return (
+            (event is not None and event not in dictionaries["event"])
+            or (user_id is not None and user_id not in dictionaries["user_id"])
+            or (min_score is not None and (unscored or meta["max_damage_score"] < min_score))
+            or (max_score is not None and (unscored or meta["min_damage_score"] > max_score))
+            or (since is not None and meta["max_analyzed_at"] < since)
+            or (until is not None and meta["min_analyzed_at"] > until)
+        )
+
+    def _matching_rows(self, segment_id: str, meta: dict, event, user_id, min_score, max_score, since, until):
+        selected = np.ones(meta["rows"], dtype=bool)
+        for name, value in (("event", event), ("user_id", user_id)):
+            if value is not None:
+                selected &= self._column(segment_id, name) == meta["dictionaries"][name].index(value)
+        if min_score is not None or max_score is not None:
+            scores = self._column(segment_id, "damage_score")
+            if min_score is not None:
+                selected &= scores >= min_score
+            if max_score is not None:
+                selected &= scores <= max_score
+        if since is not None or until is not None:
+            analyzed_at = self._column(segment_id, "analyzed_at")
+            if since is not None:
+                selected &= analyzed_at >= since
+            if until is not None:
+                selected &= analyzed_at < until
+        return np.flatnonzero(selected)
+
+    def query(self, event: str = None, user_id: str = None, min_score: float = None, max_score: float = None,
+              since=None, until=None, columns=None, latest: bool = False, limit: int = None):
+        """
+        Returns the matching records as a pandas DataFrame, newest segment
+        first. `since`/`until` are epoch seconds or ISO dates (`until` is
+        exclusive). `columns` limits what is loaded; the "segment" and "row"
+        columns that locate each record's mask are always included. With
+        `latest`, only the newest record of each re-analyzed image is kept.
+        """
+        import pandas as pd
+
+        since, until = _timestamp(since), _timestamp(until)
+        columns = list(columns or COLUMNS)
+        if latest:
+            columns += [c for c in ("user_id", "folder_path", "image_name", "analyzed_at") if c not in columns]
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown result columns {sorted(unknown)}, expected some of {COLUMNS}")
+
+        for attempt in range(SCAN_ATTEMPTS):
+            try:
+                frames = self._scan(columns, event, user_id, min_score, max_score, since, until,
+                                    None if latest else limit)
+                break
+            except FileNotFoundError:
+                # compact() deleted a segment mid-scan; a fresh listing sees its merged replacement
+                if attempt == SCAN_ATTEMPTS - 1:
+                    raise
+
+        if not frames:
+            return pd.DataFrame(columns=["segment", "row", *columns])
+        # Categories differ between segments, so they are combined as plain strings
+        df = pd.concat(frames, ignore_index=True)
+        for name in CATEGORY_COLUMNS:
+            if name in df and isinstance(df[name].dtype, pd.CategoricalDtype):
+                df[name] = df[name].astype(str)
+        if latest:
+            df = df.sort_values("analyzed_at", ascending=False, kind="stable")
+            df = df.drop_duplicates(subset=["user_id", "folder_path", "image_name"]).reset_index(drop=True)
+        return df.head(limit) if limit else df
+
+    def _scan(self, columns, event, user_id, min_score, max_score, since, until, limit) -> list:
+        """One DataFrame per segment with matching rows, newest segment first."""
+        import pandas as pd
+
+        frames, total = [], 0
+        for segment_id in reversed(self.segments()):
+            meta = self._meta(segment_id)
+            if self._prunable(meta, event, user_id, min_score, max_score, since, until):
+                continue
+            rows = self._matching_rows(segment_id, meta, event, user_id, min_score, max_score, since, until)
+            if not rows.size:
+                continue
+
+            data = {"segment": segment_id, "row": rows}
+            for name in columns:
+                if name in NUMERIC_COLUMNS:
+                    data[name] = np.asarray(self._column(segment_id, name)[rows])
+                elif name in CATEGORY_COLUMNS:
+                    codes = np.asarray(self._column(segment_id, name)[rows])
+                    data[name] = pd.Categorical.from_codes(codes, meta["dictionaries"][name])
+            if any(name in TEXT_COLUMNS for name in columns):
+                text = self._text(segment_id, rows)
+                data.update({name: text[name] for name in columns if name in TEXT_COLUMNS})
+            frames.append(pd.DataFrame(data))
+
+            total += rows.size
+            if limit and total >= limit:
+                break
+        return frames
+
+    def records(self, limit: int = RESULT_QUERY_LIMIT, **filters) -> list:
+        """query() as JSON-ready dicts, for the API."""
+        # to_json turns numpy scalars and NaN into plain JSON values
+        return json.loads(self.query(limit=limit, **filters).to_json(orient="records"))
+
+    def summary(self, group_by: str = "event", **filters) -> list:
+        """Image count and damage score statistics per `group_by` value; reads no text."""
+        if group_by not in CATEGORY_COLUMNS:
+            raise ValueError(f"Cannot group results by '{group_by}', expected one of {CATEGORY_COLUMNS}")
+        df = self.query(columns=[group_by, "damage_score", "analyzed_at"], **filters)
+        if df.empty:
+            return []
+        grouped = df.groupby(group_by).agg(
+            images=("damage_score", "size"),
+            mean_damage_score=("damage_score", "mean"),
+            max_damage_score=("damage_score", "max"),
+            first_analyzed_at=("analyzed_at", "min"),
+            last_analyzed_at=("analyzed_at", "max"),
+        ).reset_index()
+        grouped["mean_damage_score"] = grouped["mean_damage_score"].round(2)
+        return json.loads(grouped.sort_values("max_damage_score", ascending=False).to_json(orient="records"))
+
+    def mask(self, segment_id: str, row: int) -> np.ndarray:
+        """The stored class mask of one record, or None if it was not kept."""
+        path = os.path.join(self.segments_dir, segment_id, "masks.npz")
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as masks:
+            return masks[str(row)] if str(row) in masks.files else None
+
+    def export(self, path: str, fmt: str = None, **filters) -> int:
+        """
+        Writes the matching records to `path` as Parquet, Feather (Arrow) or
+        CSV, picked from `fmt` or the file extension. Parquet and Feather
+        need pyarrow. Returns the number of rows written.
+        """
+        fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+        df = self.query(**filters)
+        if fmt == "parquet":
+            df.to_parquet(path, index=False)
+        elif fmt in ("feather", "arrow"):
+            df.to_feather(path)
+        elif fmt == "csv":
+            df.to_csv(path, index=False)
+        else:
+            raise ValueError(f"Unknown export format '{fmt}', expected parquet, feather or csv")
+        return len(df)
+
+    # --- maintenance ---
+
+    def compact(self, max_rows: int = RESULT_STORE_SEGMENT_ROWS) -> int:
+        """
+        Merges runs of small segments into segments of up to `max_rows` rows,
+        so months of per-folder appends do not turn into thousands of files.
+        Returns the number of segments removed.
+
+        A merged segment records the ids it replaces, so from the moment it
+        is committed readers skip the old segments and never see a row
+        twice; only then are the old directories deleted. Replaced segments
+        left behind by an interrupted compaction are deleted on the next run.
+        """
+        with self._lock:
+            live, replaced = self._listing()
+            for segment_id in replaced:
+                shutil.rmtree(os.path.join(self.segments_dir, segment_id), ignore_errors=True)
+
+            groups, group, rows = [], [], 0
+            for segment_id in live:
+                size = self._meta(segment_id)["rows"]
+                if group and rows + size > max_rows:
+                    groups.append(group)
+                    group, rows = [], 0
+                group.append(segment_id)
+                rows += size
+            groups.append(group)
+
+            removed = 0
+            for group in groups:
+                if len(group) < 2:
+                    continue
+                self._merge(group)
+                for segment_id in group:
+                    shutil.rmtree(os.path.join(self.segments_dir, segment_id), ignore_errors=True)
+                removed += len(group) - 1
+            return removed
+
+    def _merge(self, group: list) -> str:
+        """
+        Commits one segment holding the rows of `group`, in order. Columns are
+        concatenated and categories re-coded against a merged dictionary;
+        text lines and masks are streamed across, so memory holds one mask
+        at a time rather than the whole group.
+        """
+        metas = [self._meta(segment_id) for segment_id in group]
+        numbers = {
+            name: np.concatenate([self._column(segment_id, name) for segment_id in group])
+            for name in NUMERIC_COLUMNS
+        }
+        categories = {}
+        for name in CATEGORY_COLUMNS:
+            dictionary = list(dict.fromkeys(value for meta in metas for value in meta["dictionaries"][name]))
+            lookup = {value: code for code, value in enumerate(dictionary)}
+            codes = []
+            for segment_id, meta in zip(group, metas):
+                recode = np.array([lookup[value] for value in meta["dictionaries"][name]], dtype=np.int32)
+                codes.append(recode[self._column(segment_id, name)])
+            categories[name] = (np.concatenate(codes), dictionary)
+
+        def write_text(f):
+            for segment_id in group:
+                with gzip.open(os.path.join(self.segments_dir, segment_id, "text.jsonl.gz"), "rt") as source:
+                    shutil.copyfileobj(source, f)
+
+        def masks():
+            offset = 0
+            for segment_id, meta in zip(group, metas):
+                if meta["masks"]:
+                    with np.load(os.path.join(self.segments_dir, segment_id, "masks.npz")) as stored:
+                        for key in stored.files:
+                            yield offset + int(key), stored[key]
+                offset += meta["rows"]
+
+        return self._commit_segment(
+            sum(meta["rows"] for meta in metas), numbers, categories, write_text, masks(),
+            created=group[-1].rsplit("-", 1)[0], replaces=group,
+        )
+
+
+def _commit_stamp() -> str:
+    """
+    UTC time with nanoseconds, e.g. 20260101T120000.123456789, strictly
+    increasing within the process so segments committed in the same
+    second (or clock tick) still sort in commit order.
+    """
+    global _last_stamp_ns
+    with _stamp_lock:
+        now = _last_stamp_ns = max(time.time_ns(), _last_stamp_ns + 1)
+    seconds, nanoseconds = divmod(now, 1_000_000_000)
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(seconds))}.{nanoseconds:09d}"
+
+
+_stamp_lock = threading.Lock()
+_last_stamp_ns = 0
+
+
+def _write_masks(path: str, masks) -> int:
+    """
+    Writes (row, mask) pairs to an .npz file readable by np.load, one entry
+    at a time, and returns how many were written; no file is left when
+    there were none.
+    """
+    count = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for row, mask in masks:
+            with archive.open(f"{row}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asanyarray(mask), allow_pickle=False)
+            count += 1
+    if not count:
+        os.remove(path)
+    return count
+
+
+def _numeric(record: dict, name: str):
+    """Numeric column value of a record; mask-derived columns come from its mask stats."""
+    if name in record:
+        value = record[name]
+    else:
+        stats = record.get("mask_stats") or {}
+        if name == "building_components":
+            value = stats.get("building_components")
+        else:
+            value = (stats.get("class_fractions") or {}).get(name[:-len("_fraction")])
+    if value is None:
+        return -1 if NUMERIC_COLUMNS[name] == np.int32 else np.nan
+    return value
+
+
+# Shared instance used by the API
+result_store = ResultStore()
@@ -0,0 +1,142 @@
+# src/pipeline/stages.py
+import os
+import queue
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Items (e.g. decoded batches) that may wait between two stages before the producer blocks
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+
+_END = object()
+
+
+class _Stage:
+    def __init__(self, name: str, fn, workers: int, queue_size: int, on_done=None):
+        self.name = name
+        self.fn = fn
+        self.on_done = on_done
+        self.workers = max(1, workers)
+        self.output = queue.Queue(maxsize=max(1, queue_size))
+        self.remaining = self.workers
+        self.lock = threading.Lock()
+
+
+class StagedPipeline:
+    """
+    Runs items through a chain of stages on threads connected by bounded queues.
+
+    Each stage function takes one item and returns an iterable of output
+    items (so a stage can split a batch into images, or drop an item). All
+    stages run concurrently: while one stage works on item N+1, the next is
+    already busy with item N. Queues hold at most `queue_size` items, so a
+    fast stage blocks instead of running ahead of a slow one and piling up
+    decoded images in memory.
+
+    Iterating the pipeline yields the outputs of the last stage as they are
+    produced. An exception in any stage stops the pipeline and is re-raised
+    to the consumer.
+    """
+
+    def __init__(self, source, queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.source = source
+        self.queue_size = queue_size
+        self.stages = []
+        self._stop = threading.Event()
+        self._error = None
+
+    def add_stage(self, name: str, fn, workers: int = 1, queue_size: int = None, on_done=None) -> "StagedPipeline":
+        """Appends a stage; `on_done()` is called once its last item has been processed."""
+        queue_size = self.queue_size if queue_size is None else queue_size
+        self.stages.append(_Stage(name, fn, workers, queue_size, on_done))
+        return self
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Blocks until `item` is queued; gives up if the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error: Exception):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _run_source(self, output: queue.Queue):
+        try:
+            for item in self.source:
+                if not self._put(output, item):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(output, _END)
+
+    def _run_worker(self, stage: _Stage, input_queue: queue.Queue):
+        try:
+            while True:
+                item = self._get(input_queue)
+                if item is _END:
+                    # Let sibling workers of this stage see the end of input too
+                    self._put(input_queue, _END)
+                    break
+                for result in stage.fn(item):
+                    if not self._put(stage.output, result):
+                        return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            with stage.lock:
+                stage.remaining -= 1
+                last = stage.remaining == 0
+            if last:
+                if stage.on_done and not self._stop.is_set():
+                    try:
+                        stage.on_done()
+                    except Exception as e:
+                        self._fail(e)
+                self._put(stage.output, _END)
+
+    def __iter__(self):
+        if not self.stages:
+            yield from self.source
+            return
+
+        source_queue = queue.Queue(maxsize=max(1, self.queue_size))
+        threads = [threading.Thread(target=self._run_source, args=(source_queue,), name="stage-source", daemon=True)]
+        input_queue = source_queue
+        for stage in self.stages:
+            for i in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_worker, args=(stage, input_queue), name=f"stage-{stage.name}-{i}", daemon=True,
+                ))
+            input_queue = stage.output
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(input_queue)
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
@@ -1,102 +1,216 @@
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pandas as pd
 from langchain.tools import tool
+import json
 import os
+import time
 import uuid
 from typing import List, Dict
 
-@tool
-def create_dashboard(analysis_results: List[Dict]) -> str:
-    """ 
-    Creates an interactive HTML dashboard from the analysis results.
-    The dashboard includes a bar chart of damage scores and a detailed table.
-    Saves the dashboard to a file and returns the file path.
+# === CONFIG ===
+DASHBOARD_DIR = os.path.join("outputs", "dashboards")
+# "cdn" links plotly.js from the CDN; "directory" writes one shared plotly.min.js next to the dashboards
+DASHBOARD_PLOTLYJS = os.getenv("DASHBOARD_PLOTLYJS", "cdn")
+# The table lists only the most damaged images; every image is still in the scatter plot
+DASHBOARD_TABLE_ROWS = int(os.getenv("DASHBOARD_TABLE_ROWS", "200"))
+# Above this many located images the map shows aggregated grid cells instead of points
+DASHBOARD_MAP_MAX_POINTS = int(os.getenv("DASHBOARD_MAP_MAX_POINTS", "2000"))
+DASHBOARD_MAP_BINS = int(os.getenv("DASHBOARD_MAP_BINS", "60"))
+EXPLANATION_CHARS = 100
+
+COLUMNS = ["image_path", "damage_score", "explanation", "latitude", "longitude"]
+
+
+def _normalize(analysis_results: List[Dict]) -> list:
+    """Keeps the dashboard columns; accepts 'damage_explanation' as the pipeline names it."""
+    rows = []
+    for item in analysis_results:
+        rows.append({
+            "image_path": item["image_path"],
+            "damage_score": item["damage_score"],
+            "explanation": item.get("explanation", item.get("damage_explanation", "")),
+            "latitude": item.get("latitude"),
+            "longitude": item.get("longitude"),
+        })
+    return rows
+
+
+def _data_path(dashboard_path: str) -> str:
+    """Rows behind a dashboard live next to it, so new results can be appended later."""
+    return os.path.splitext(dashboard_path)[0] + ".jsonl"
 
-    Args:
-        analysis_results: A list of dictionaries, where each dictionary 
-                          represents the analysis of one image and must contain
-                          'image_path', 'damage_score', and 'explanation'.
-    """
-    if not analysis_results:
-        return "Error: No analysis results provided to create a dashboard."
 
-    # --- 1. Prepare Data ---
-    df = pd.DataFrame(analysis_results)
-    # Extract just the filename for cleaner labels
-    df['image_name'] = df['image_path'].apply(lambda p: os.path.basename(p))
-    df = df.sort_values(by='damage_score', ascending=False)
-
-    # --- 2. Create Figure ---
-    fig = make_subplots(
-        rows=2, cols=1, 
-        shared_xaxes=False,
-        vertical_spacing=0.1,
-        subplot_titles=("Damage Score per Image", "Detailed Analysis"),
-        specs=[[{"type": "bar"}], [{"type": "table"}]]
+def _load_rows(dashboard_path: str, new_rows: list, append: bool):
+    import pandas as pd
+
+    data_path = _data_path(dashboard_path)
+    mode = "a" if append and os.path.exists(data_path) else "w"
+    with open(data_path, mode) as f:
+        for row in new_rows:
+            f.write(json.dumps(row) + "\n")
+
+    df = pd.read_json(data_path, lines=True, dtype={"image_path": str, "explanation": str})
+    for column in COLUMNS:
+        if column not in df:
+            df[column] = None
+    # A re-analyzed image replaces its earlier row
+    return df.drop_duplicates(subset="image_path", keep="last").reset_index(drop=True)
+
+
+def _hover_text(df):
+    """Hover labels built with vectorized string operations."""
+    explanation = (
+        df["explanation"].fillna("").astype(str).str.slice(0, EXPLANATION_CHARS)
+        .str.replace("&", "&amp;", regex=False).str.replace("<", "&lt;", regex=False)
     )
+    return "Image: " + df["image_name"] + "<br>Damage: " + df["damage_score"].round(1).astype(str) \
+        + "<br>" + explanation
 
-    # --- 3. Add Bar Chart ---
-    fig.add_trace(go.Bar(
-        x=df['image_name'], 
-        y=df['damage_score'],
-        marker=dict(
-        color=df['damage_score'],
-        colorscale='Reds'
-     ),
-        showlegend=False,
-        text=df['damage_score'],
-        hoverinfo='x+y'
-    ), row=1, col=1)
 
-    # --- 4. Add Table ---
-    fig.add_trace(go.Table(
-        header=dict(values=['Image Name', 'Damage Score', 'Explanation'],
-                    fill_color='paleturquoise',
-                    align='left'),
-        cells=dict(values=[df.image_name, df.damage_score, df.explanation],
-                   fill_color='lavender',
-                   align='left')
+def _map_points(located, max_points: int, bins: int):
+    """
+    Points for the map. Large sets are binned on a lat/lon grid server-side:
+    one marker per occupied cell, sized by image count and coloured by the
+    worst damage in the cell.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if len(located) <= max_points:
+        return pd.DataFrame({
+            "lat": located["latitude"], "lon": located["longitude"], "score": located["damage_score"],
+            "size": 9, "text": located["hover"],
+        })
+
+    lat, lon = located["latitude"].to_numpy(float), located["longitude"].to_numpy(float)
+    cell = max(np.ptp(lat), np.ptp(lon), 1e-6) / bins
+    keys = pd.DataFrame({
+        "row": np.floor((lat - lat.min()) / cell).astype(int),
+        "col": np.floor((lon - lon.min()) / cell).astype(int),
+        "lat": lat, "lon": lon, "score": located["damage_score"].to_numpy(float),
+    })
+    cells = keys.groupby(["row", "col"]).agg(
+        lat=("lat", "mean"), lon=("lon", "mean"), score=("score", "max"),
+        mean=("score", "mean"), count=("score", "size"),
+    ).reset_index(drop=True)
+    cells["size"] = 6 + 4 * np.log2(cells["count"])
+    cells["text"] = cells["count"].astype(str) + " images<br>Max damage: " + cells["score"].round(1).astype(str) \
+        + "<br>Mean damage: " + cells["mean"].round(1).astype(str)
+    return cells
+
+
+def build_dashboard(analysis_results: List[Dict], dashboard_path: str = None, append: bool = False,
+                    include_plotlyjs: str = DASHBOARD_PLOTLYJS) -> dict:
+    """
+    Writes an HTML dashboard for `analysis_results` and returns
+    {"path", "rows", "bytes", "seconds"}.
+
+    With `append`, the results are added to the existing dashboard at
+    `dashboard_path` instead of replacing it. Only the new rows are written
+    to its data file and the page is regenerated from the stored rows.
+    Images without latitude/longitude are left off the map; if no image
+    has coordinates the map is omitted.
+    """
+    start = time.perf_counter()
+    # plotly and pandas are slow to import, so they load with the first dashboard
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    if dashboard_path is None:
+        os.makedirs(DASHBOARD_DIR, exist_ok=True)
+        dashboard_path = os.path.join(DASHBOARD_DIR, f"dashboard_{str(uuid.uuid4())[:8]}.html")
+    else:
+        os.makedirs(os.path.dirname(dashboard_path) or ".", exist_ok=True)
+
+    df = _load_rows(dashboard_path, _normalize(analysis_results), append)
+    df["damage_score"] = df["damage_score"].astype(float)
+    df["image_name"] = df["image_path"].str.rsplit("/", n=1).str[-1]
+    df = df.sort_values(by="damage_score", ascending=False, kind="stable").reset_index(drop=True)
+    df["hover"] = _hover_text(df)
+
+    located = df.dropna(subset=["latitude", "longitude"])
+    has_map = not located.empty
+    titles = ["Damage Score Distribution", "Damage Score per Image (ranked)",
+              f"Top {min(DASHBOARD_TABLE_ROWS, len(df))} Most Damaged Images"]
+    specs = [[{"type": "xy"}], [{"type": "xy"}], [{"type": "table"}]]
+    if has_map:
+        titles.append("Damage Map" + (" (binned)" if len(located) > DASHBOARD_MAP_MAX_POINTS else ""))
+        specs.append([{"type": "map"}] if hasattr(go, "Scattermap") else [{"type": "mapbox"}])
+
+    fig = make_subplots(rows=len(specs), cols=1, vertical_spacing=0.06, subplot_titles=titles, specs=specs)
+
+    # --- Distribution, counted server-side ---
+    counts = df["damage_score"].round().clip(0, 10).astype(int).value_counts().reindex(range(11), fill_value=0)
+    fig.add_trace(go.Bar(x=counts.index, y=counts.values, marker=dict(color=counts.index, colorscale="Reds"),
+                         hovertemplate="Score %{x}: %{y} images<extra></extra>"), row=1, col=1)
+
+    # --- Every image, drawn with WebGL ---
+    fig.add_trace(go.Scattergl(
+        x=df.index, y=df["damage_score"], mode="markers", text=df["hover"], hoverinfo="text",
+        marker=dict(color=df["damage_score"], colorscale="Reds", cmin=0, cmax=10, size=5),
     ), row=2, col=1)
 
-    # --- 5. Style and Save ---
+    # --- Table ---
+    top = df.head(DASHBOARD_TABLE_ROWS)
+    fig.add_trace(go.Table(
+        header=dict(values=["Image Name", "Damage Score", "Explanation"], fill_color="paleturquoise", align="left"),
+        cells=dict(values=[top["image_name"], top["damage_score"], top["explanation"]],
+                   fill_color="lavender", align="left"),
+    ), row=3, col=1)
+
+    # --- Map ---
+    if has_map:
+        points = _map_points(located, DASHBOARD_MAP_MAX_POINTS, DASHBOARD_MAP_BINS)
+        marker = dict(size=points["size"], color=points["score"], colorscale="Reds", cmin=0, cmax=10, showscale=True)
+        center = dict(lat=float(points["lat"].mean()), lon=float(points["lon"].mean()))
+        if hasattr(go, "Scattermap"):
+            fig.add_trace(go.Scattermap(lat=points["lat"], lon=points["lon"], mode="markers", marker=marker,
+                                        text=points["text"], hoverinfo="text"), row=4, col=1)
+            fig.update_layout(map=dict(style="open-street-map", center=center, zoom=8))
+        else:
+            fig.add_trace(go.Scattermapbox(lat=points["lat"], lon=points["lon"], mode="markers", marker=marker,
+                                           text=points["text"], hoverinfo="text"), row=4, col=1)
+            fig.update_layout(mapbox=dict(style="open-street-map", center=center, zoom=8))
+
     fig.update_layout(
-        title_text='Disaster Analysis Dashboard',
-        height=1000,
+        title_text=f"Disaster Analysis Dashboard ({len(df)} images"
+                   + ("" if has_map else ", no coordinates to map") + ")",
+        height=450 * len(specs),
         showlegend=False,
         margin=dict(l=20, r=20, t=100, b=20)
     )
-    fig.update_yaxes(title_text="Damage Score (0-10)", row=1, col=1)
-    fig.add_trace(go.Scattermapbox(
-        lat=df['latitude'],
-        lon=df['longitude'],
-        mode='markers',
-        marker=go.scattermapbox.Marker(
-            size=10,
-            color=df['damage_score'],
-            colorscale='Reds',
-            cmin=0,
-            cmax=10,
-            showscale=True
-        ),
-        text=[f"Image: {row['image_name']}<br>Damage: {row['damage_score']}<br>Explanation: {row['explanation']}" for index, row in df.iterrows()],
-        hoverinfo='text'
-    ), row=2, col=1)
+    fig.update_xaxes(title_text="Damage Score", row=1, col=1)
+    fig.update_xaxes(title_text="Rank", row=2, col=1)
+    fig.update_yaxes(title_text="Images", row=1, col=1)
+    fig.update_yaxes(title_text="Damage Score (0-10)", row=2, col=1)
+
+    fig.write_html(dashboard_path, include_plotlyjs=include_plotlyjs, full_html=True)
+
+    return {
+        "path": dashboard_path,
+        "rows": len(df),
+        "bytes": os.path.getsize(dashboard_path),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
 
-    fig.update_layout(
-        mapbox_style="open-street-map",
-        mapbox_center_lat = df['latitude'].mean() if not df['latitude'].empty else 0,
-        mapbox_center_lon = df['longitude'].mean() if not df['longitude'].empty else 0,
-        mapbox_zoom=8
-    )
 
-    # Create unique output directory
-    output_dir = os.path.join("outputs", "dashboards")
-    os.makedirs(output_dir, exist_ok=True)
-    file_name = f"dashboard_{str(uuid.uuid4())[:8]}.html"
-    file_path = os.path.join(output_dir, file_name)
+@tool
+def create_dashboard(analysis_results: List[Dict], dashboard_path: str = None) -> str:
+    """
+    Creates an interactive HTML dashboard from the analysis results.
+    The dashboard includes a damage score distribution, a ranked plot of every
+    image, a table of the most damaged images and, when results carry
+    'latitude' and 'longitude', a map.
+    Saves the dashboard to a file and returns the file path.
 
-    fig.write_html(file_path)
+    Args:
+        analysis_results: A list of dictionaries, where each dictionary
+                          represents the analysis of one image and must contain
+                          'image_path', 'damage_score', and 'explanation'
+                          (or 'damage_explanation').
+        dashboard_path: Path of an existing dashboard to append the results to.
+    """
+    if not analysis_results:
+        return "Error: No analysis results provided to create a dashboard."
 
-    print(f"Dashboard created successfully at: {file_path}")
-    return f"Dashboard successfully created and saved to {file_path}"
\ No newline at end of file
+    summary = build_dashboard(analysis_results, dashboard_path=dashboard_path, append=dashboard_path is not None)
+    print(f"Dashboard created successfully at: {summary['path']} ({summary})")
+    return f"Dashboard successfully created and saved to {summary['path']}"
@@ -1,40 +1,215 @@
 # src/tools/image_analysis_tool.py
 import os
+import threading
+from types import SimpleNamespace
 from langchain.tools import tool
-from src.image_analysis.segmentation_model import segmentation_model
-from src.image_analysis.image_segmentation import image_segmentation
-from src.image_analysis.mask_analysis import analyze_image
+from src.image_analysis.model_registry import get_segmentation_model
+from src.image_analysis.image_segmentation import (
+    decode_chunk, infer_chunk, make_output_dir, postprocess_segmentation, resolve_batch_size, segment_large_image,
+)
+from src.image_analysis.mask_analysis import DamageScorer, DamageAnalysisResult, GEMINI_MAX_CONCURRENCY
+from src.image_analysis.dedup import DEDUP_ENABLED, DuplicateFilter
+from src.image_analysis.inference_pool import inference_pool
+from src.image_analysis.llm_image import encode_for_llm
+from src.image_analysis.rendering import RENDER_MODE
+from src.image_analysis.tiling import TILE_MODE, should_tile
+from src.pipeline.stages import StagedPipeline
+from utils.metrics import span
 from PIL import Image
 
-@tool
-def run_full_damage_analysis(image_folder: str) -> list:
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# When enabled, only images whose mask heuristic is ambiguous are sent to Gemini
+MASK_TRIAGE = os.getenv("MASK_TRIAGE", "").strip().lower() in ("1", "true", "yes", "on")
+# Threads rendering masks and computing mask statistics, so one slow image does not hold up the rest
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+
+def heuristic_result(mask_stats: dict) -> DamageAnalysisResult:
+    """Builds a damage result from mask statistics alone, for confidently triaged images."""
+    fractions = mask_stats["class_fractions"]
+    return DamageAnalysisResult(
+        damage_score=int(round(mask_stats["heuristic_damage_score"])),
+        damage_explanation=(
+            f"Scored from the segmentation mask without LLM review: "
+            f"{fractions['building']:.0%} buildings, {fractions['road']:.0%} roads, "
+            f"{fractions['water']:.0%} water, {fractions['debris']:.0%} bare ground/debris, "
+            f"{mask_stats['building_components']} separate building regions."
+        ),
+    )
+
+def _segmentation_batches(image_paths, batch_size: int, tile_mode: str):
+    """Groups image paths into inference batches; images picked for tiling travel alone."""
+    batch = []
+    for index, image_path in enumerate(image_paths):
+        info = {"index": index, "image_path": image_path}
+        if should_tile(image_path, tile_mode):
+            yield ("tiled", info)
+            continue
+        batch.append(info)
+        if len(batch) == batch_size:
+            yield ("batch", batch)
+            batch = []
+    if batch:
+        yield ("batch", batch)
+
+def full_damage_analysis(image_folder: str, progress=None, image_paths=None, triage: bool = MASK_TRIAGE,
+                         dedup: bool = DEDUP_ENABLED, keep_masks: bool = False) -> list:
     """
-    Runs the complete image segmentation and damage analysis pipeline on a given folder.
-    Returns a list of dictionaries with the analysis results for each image.
+    Runs segmentation and damage scoring on every image in a folder.
+    `image_paths` may be an iterable of files still being downloaded into the
+    folder, in which case segmentation starts as soon as the first ones land.
+    With `triage`, images whose mask heuristic is confidently low or high are
+    scored locally and only ambiguous ones go to the LLM.
+    With `dedup`, near-duplicate frames are analyzed once and share their
+    representative's result, marked with `duplicate_of`.
+    With `keep_masks`, each result also carries its model-resolution class
+    mask as "mask" (None for tiled images), e.g. for the result store.
+    `progress(event, **data)` is called at each stage and as each image is
+    scored. Image events carry the running `segmented` count and, once every
+    image has been found, the `total`; the "scoring" stage event announces
+    that total as soon as the source runs dry.
+
+    Decoding, SegFormer inference, rendering and LLM scoring run as
+    concurrent stages connected by bounded queues: while the model works on
+    one batch, the previous batch is being rendered and scored, so wall time
+    approaches that of the slowest stage rather than the sum of all stages.
+    With INFERENCE_WORKERS set, batches are decoded and sent to the inference
+    worker pool in parallel, one in flight per worker, and this process only
+    loads the model itself if an image needs tiled inference.
     """
-    print("Loading SegFormer Model...")
-    model, extractor = segmentation_model()
+    progress = progress or (lambda event, **data: None)
+    if inference_pool:
+        # Decoding and mask cache keys only need the workers' config and extractor
+        config, extractor = inference_pool.model_info()
+        model = SimpleNamespace(config=config)
+    else:
+        model, extractor = get_segmentation_model()
 
     print("Preparing image data...")
-    image_data = []
-    for f in os.listdir(image_folder):
-        if f.lower().endswith((".png", ".jpg", ".jpeg")):
-            image_path = os.path.join(image_folder, f)
-            image_data.append({"image_path": image_path})
+    if image_paths is None:
+        image_paths = (os.path.join(image_folder, f) for f in os.listdir(image_folder))
+    image_paths = (p for p in image_paths if p.lower().endswith(IMAGE_EXTENSIONS))
+    duplicate_filter = DuplicateFilter() if dedup else None
+    if duplicate_filter:
+        image_paths = duplicate_filter.filter(image_paths)
+
+    output_dir = make_output_dir(render_mode=RENDER_MODE)
+    batch_size = resolve_batch_size(model, extractor)
+    scorer = DamageScorer()
+    segmented = 0
+    segmented_lock = threading.Lock()
+    total = None
+    # Keep every pool worker busy; without a pool a second inference thread would only contend for torch
+    parallel_batches = inference_pool.workers if inference_pool else 1
+
+    def batches():
+        nonlocal total
+        discovered = 0
+        for kind, payload in _segmentation_batches(image_paths, batch_size, TILE_MODE):
+            discovered += len(payload) if kind == "batch" else 1
+            yield kind, payload
+        total = discovered
+        progress("stage", stage="scoring", total=total)
+
+    def decode(item):
+        kind, payload = item
+        if kind == "batch":
+            yield ("decoded", decode_chunk(payload, model, extractor))
+        else:
+            yield item
+
+    def infer(item):
+        kind, payload = item
+        if kind == "decoded":
+            yield from (("segmented", result) for result in infer_chunk(payload, model, inference_pool))
+        else:
+            tiled_model = get_segmentation_model()[0] if inference_pool else model
+            result = segment_large_image(payload, tiled_model, extractor, output_dir)
+            yield ("postprocessed", {**result, "index": payload["index"]})
+
+    def postprocess(item):
+        nonlocal segmented
+        kind, payload = item
+        if kind == "segmented":
+            info, image, mask = payload
+            keep_image = False
+            try:
+                result = postprocess_segmentation(info, image, mask, output_dir, RENDER_MODE)
+                # The LLM image is only encoded in the scoring stage, once the cache and triage have had their say
+                keep_image = not triage or result["mask_stats"]["needs_llm_review"]
+            finally:
+                if not keep_image:
+                    image.close()
+            payload = {**result, "index": info["index"]}
+            if keep_image:
+                payload["image"] = image
+            if keep_masks:
+                payload["mask"] = mask
+        with segmented_lock:
+            segmented += 1
+        yield payload
 
-    print("Generating Segmentation Masks...")
-    processed_segmentation_results = image_segmentation(image_data=image_data, model=model, extractor=extractor)
+    def score(item):
+        image = item.pop("image", None)
+        try:
+            if triage and not item["mask_stats"]["needs_llm_review"]:
+                result = heuristic_result(item["mask_stats"])
+            else:
+                key, result = scorer.cached(item["image_path"])
+                if result is None:
+                    llm_image = None
+                    if image is not None:
+                        with span("llm_image_encoding"):
+                            llm_image = encode_for_llm(image, item["image_path"])
+                        image.close()
+                        image = None
+                    # Tiled images were never decoded whole, so the scorer reads them from disk
+                    result = scorer.score(item["image_path"], llm_image, key)
+        finally:
+            if image is not None:
+                image.close()
+        yield item, result
+
+    print("Generating Segmentation Masks and Performing Damage Analysis...")
+    progress("stage", stage="segmentation")
+    pipeline = (
+        StagedPipeline(batches())
+        .add_stage("decode", decode, workers=parallel_batches)
+        .add_stage("inference", infer, workers=parallel_batches, queue_size=batch_size * 2)
+        .add_stage("postprocess", postprocess, workers=POSTPROCESS_WORKERS)
+        .add_stage("scoring", score, workers=GEMINI_MAX_CONCURRENCY)
+    )
+
+    scored = []
+    for item, analysis_result in pipeline:
+        scored.append((item, analysis_result))
+        progress("image", image_path=item["image_path"], damage_score=analysis_result.damage_score,
+                 completed=len(scored), segmented=segmented, total=total)
+
+    if output_dir:
+        print(f"Saved results in: {output_dir}")
 
-    print("Performing Damage Analysis...")
     final_results = []
-    for item in processed_segmentation_results:
-        analysis_result = analyze_image(
-            image_path=item["image_path"]
-        )
+    for item, analysis_result in sorted(scored, key=lambda pair: pair[0]["index"]):
         final_results.append({
             "image_path": item["image_path"],
             "damage_score": analysis_result.damage_score,
             "damage_explanation": analysis_result.damage_explanation,
+            "heuristic_damage_score": item["mask_stats"]["heuristic_damage_score"],
+            "mask_stats": item["mask_stats"],
         })
-        
-    return final_results
\ No newline at end of file
+        if keep_masks:
+            final_results[-1]["mask"] = item.get("mask")
+
+    if duplicate_filter:
+        final_results = duplicate_filter.expand(final_results)
+        print(f"Near-duplicates shared their representative's result: {duplicate_filter.stats()}")
+
+    return final_results
+
+@tool
+def run_full_damage_analysis(image_folder: str) -> list:
+    """
+    Runs the complete image segmentation and damage analysis pipeline on a given folder.
+    Returns a list of dictionaries with the analysis results for each image.
+    """
+    return full_damage_analysis(image_folder)
@@ -0,0 +1,184 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.metrics import CACHE_LOOKUPS
+
+load_dotenv()
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(ROOT_DIR, "cache", "results.sqlite"))
+CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "100000"))
+CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# A hit refreshes an entry's LRU timestamp only if it is older than this, so reads rarely write
+CACHE_TOUCH_INTERVAL_SECONDS = float(os.getenv("RESULT_CACHE_TOUCH_INTERVAL_SECONDS", "3600"))
+# Pending access-time updates are written in one transaction once this many pile up (or on the next set)
+CACHE_TOUCH_BATCH = 256
+CACHE_BYPASS = os.getenv("RESULT_CACHE_BYPASS", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_key(content_hash: str, *versions) -> str:
+    """Combines a content hash with model/prompt versions into one cache key."""
+    return hashlib.sha256("|".join([content_hash, *map(str, versions)]).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent SQLite key/value store for analysis results.
+
+    Entries live in namespaces (e.g. "damage", "mask"), expire after
+    `ttl_seconds` and are evicted least-recently-used once more than
+    `max_entries` are stored. Hit/miss counters are kept per namespace.
+
+    Hits do not write on every lookup: access times older than
+    `touch_interval` are queued and written in batches, which is plenty of
+    precision for LRU eviction.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = CACHE_TTL_SECONDS, bypass: bool = CACHE_BYPASS,
+                 touch_interval: float = CACHE_TOUCH_INTERVAL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bypass = bypass
+        self.touch_interval = touch_interval
+        self._touched = {}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        return self._conn
+
+    def get(self, namespace: str, key: str, ttl_seconds: float = None):
+        """Returns the stored bytes, or None on a miss, expiry or bypass."""
+        if self.bypass:
+            return None
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at, accessed_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None or (ttl_seconds and now - row[1] > ttl_seconds):
+                if row is not None:
+                    conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                    conn.commit()
+                self.misses[namespace] += 1
+                CACHE_LOOKUPS.inc(namespace=namespace, outcome="miss")
+                return None
+            if now - row[2] > self.touch_interval:
+                self._touched[(namespace, key)] = now
+                if len(self._touched) >= CACHE_TOUCH_BATCH:
+                    self._flush_touches(conn)
+                    conn.commit()
+            self.hits[namespace] += 1
+            CACHE_LOOKUPS.inc(namespace=namespace, outcome="hit")
+            return row[0]
+
+    def set(self, namespace: str, key: str, value: bytes):
+        if self.bypass:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, now, now),
+            )
+            self._touched.pop((namespace, key), None)
+            self._flush_touches(conn)
+            self._evict(conn)
+            conn.commit()
+
+    def _flush_touches(self, conn):
+        """Writes the queued access times; the caller commits."""
+        if self._touched:
+            conn.executemany(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                [(accessed_at, namespace, key) for (namespace, key), accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self, conn):
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def get_json(self, namespace: str, key: str, ttl_seconds: float = None):
+        value = self.get(namespace, key, ttl_seconds)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, namespace: str, key: str, value):
+        self.set(namespace, key, json.dumps(value).encode("utf-8"))
+
+    def get_array(self, namespace: str, key: str):
+        value = self.get(namespace, key)
+        if value is None:
+            return None
+        with np.load(io.BytesIO(value)) as data:
+            return data["array"]
+
+    def set_array(self, namespace: str, key: str, array: np.ndarray):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, array=array)
+        self.set(namespace, key, buffer.getvalue())
+
+    def clear(self, namespace: str = None):
+        with self._lock:
+            conn = self._connection()
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            conn.commit()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters per namespace."""
+        namespaces = set(self.hits) | set(self.misses)
+        return {ns: {"hits": self.hits[ns], "misses": self.misses[ns]} for ns in sorted(namespaces)}
+
+
+# Shared instance used by the analysis pipeline
+result_cache = ResultCache()
@@ -0,0 +1,179 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from utils.metrics import span
+
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+MANIFEST_NAME = ".download_manifest.json"
+
+
+class SupabaseStorage:
+    """
+    Storage backend for a Supabase bucket.
+
+    Listing goes through the Supabase client; object bodies are streamed over a
+    pooled HTTP client so files are written to disk chunk by chunk instead of
+    being held in memory.
+    """
+
+    def __init__(self, client, url: str, key: str, bucket: str, max_connections: int = DOWNLOAD_CONCURRENCY):
+        self.client = client
+        self.bucket = bucket
+        self.base_url = f"{url.rstrip('/')}/storage/v1/object/authenticated/{bucket}"
+        self.http = httpx.Client(
+            headers={"Authorization": f"Bearer {key}", "apikey": key},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+
+    def list(self, folder_path: str) -> list:
+        """Returns [{"name", "size", "etag"}] for the objects in a folder."""
+        entries = []
+        for file_info in self.client.storage.from_(self.bucket).list(path=folder_path):
+            metadata = file_info.get("metadata") or {}
+            if not metadata:
+                # Sub-folders are listed without metadata
+                continue
+            entries.append({
+                "name": file_info["name"],
+                "size": metadata.get("size"),
+                "etag": metadata.get("eTag"),
+            })
+        return entries
+
+    def stream(self, object_path: str):
+        """Yields the object body in chunks."""
+        with self.http.stream("GET", f"{self.base_url}/{object_path}") as response:
+            response.raise_for_status()
+            yield from response.iter_bytes(DOWNLOAD_CHUNK_SIZE)
+
+
+class DownloadRun:
+    """
+    Iterator over the local paths of one folder download.
+
+    `metrics` belongs to this download only, so concurrent jobs sharing a
+    manager do not overwrite each other's figures. It fills in as files land
+    and gains "seconds" and "mb_per_second" once the run is exhausted.
+    """
+
+    def __init__(self, paths, metrics: dict):
+        self._paths = paths
+        self.metrics = metrics
+        # Set by DownloadManager.download once every file is on disk
+        self.paths = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._paths)
+
+    def close(self):
+        self._paths.close()
+
+
+class DownloadManager:
+    """
+    Downloads a storage folder with bounded concurrency.
+
+    Files whose size and etag match what was downloaded before are skipped.
+    `iter_downloads` yields local paths as each file lands, so callers can
+    start processing before the whole folder is on disk.
+    """
+
+    def __init__(self, storage, max_workers: int = DOWNLOAD_CONCURRENCY):
+        self.storage = storage
+        self.max_workers = max_workers
+
+    def iter_downloads(self, folder_path: str, local_dir: str) -> DownloadRun:
+        """Starts a download; the returned run yields paths and carries its own metrics."""
+        metrics = {}
+        return DownloadRun(self._download(folder_path, local_dir, metrics), metrics)
+
+    def _download(self, folder_path: str, local_dir: str, metrics: dict):
+        os.makedirs(local_dir, exist_ok=True)
+        manifest_path = os.path.join(local_dir, MANIFEST_NAME)
+        manifest = self._load_manifest(manifest_path)
+        manifest_lock = threading.Lock()
+
+        files = self.storage.list(folder_path)
+        metrics.update({"files": len(files), "downloaded": 0, "skipped": 0, "bytes": 0})
+        start = time.perf_counter()
+
+        def fetch(file_info):
+            name = file_info["name"]
+            local_file_path = os.path.join(local_dir, name)
+            if self._is_current(local_file_path, file_info, manifest.get(name)):
+                with manifest_lock:
+                    metrics["skipped"] += 1
+                return local_file_path
+
+            part_path = f"{local_file_path}.part"
+            written = 0
+            with span("download"):
+                with open(part_path, "wb") as f:
+                    for chunk in self.storage.stream(f"{folder_path}/{name}"):
+                        f.write(chunk)
+                        written += len(chunk)
+                os.replace(part_path, local_file_path)
+
+            with manifest_lock:
+                manifest[name] = {"size": written, "etag": file_info.get("etag")}
+                metrics["downloaded"] += 1
+                metrics["bytes"] += written
+            return local_file_path
+
+        completed = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for file_info in files:
+                future = executor.submit(fetch, file_info)
+                future.add_done_callback(completed.put)
+            try:
+                for _ in files:
+                    yield completed.get().result()
+            finally:
+                self._save_manifest(manifest_path, manifest)
+                elapsed = time.perf_counter() - start
+                metrics["seconds"] = round(elapsed, 3)
+                metrics["mb_per_second"] = round(metrics["bytes"] / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+
+    def download(self, folder_path: str, local_dir: str) -> DownloadRun:
+        """Downloads the whole folder; returns the finished run with its metrics."""
+        run = self.iter_downloads(folder_path, local_dir)
+        run.paths = list(run)
+        return run
+
+    @staticmethod
+    def _is_current(local_file_path, file_info, previous) -> bool:
+        if not os.path.exists(local_file_path):
+            return False
+        size = file_info.get("size")
+        if size is not None and os.path.getsize(local_file_path) != size:
+            return False
+        etag = file_info.get("etag")
+        if etag is not None:
+            return previous is not None and previous.get("etag") == etag
+        return size is not None
+
+    @staticmethod
+    def _load_manifest(path) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_manifest(path, manifest):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,190 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a fast cache hit up to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in the Prometheus exposition layout."""
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def snapshot(self, **labels) -> dict:
+        series = self._series.get(_label_key(labels))
+        return {"count": series["count"], "sum": series["sum"]} if series else {"count": 0, "sum": 0.0}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', repr(bound)),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them for a /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram("pipeline_stage_seconds", "Latency of one pipeline stage call, by stage.")
+STAGE_ERRORS = registry.counter("pipeline_stage_errors_total", "Pipeline stage calls that raised, by stage.")
+LLM_REQUESTS = registry.counter("llm_requests_total", "LLM requests, by model and purpose.")
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens reported by the provider, by model and direction.")
+CACHE_LOOKUPS = registry.counter("result_cache_lookups_total", "Result cache lookups, by namespace and outcome.")
+LLM_IMAGE_BYTES = registry.histogram(
+    "llm_image_bytes", "Encoded image bytes sent per LLM request, by model.",
+    buckets=tuple(2 ** k * 1024 for k in range(4, 15)),
+)
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    "llm_first_token_seconds",
+    "Time from request to first token, by model; the full latency for non-streamed responses.",
+)
+DEDUP_IMAGES = registry.counter("dedup_images_total", "Images seen by the near-duplicate filter, by outcome.")
+INFERENCE_BATCH_IMAGES = registry.histogram(
+    "inference_batch_images", "Images per forward pass in the inference worker pool.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Times a block and records it in the pipeline_stage_seconds histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage, **labels)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+_llm_callbacks = {}
+
+
+def llm_callbacks(model: str) -> list:
+    """
+    LangChain callbacks that count the token usage reported for `model` and
+    time its first token.
+    Pass as `config={"callbacks": llm_callbacks(...)}` to `invoke`.
+    """
+    if model not in _llm_callbacks:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMUsageCallback(BaseCallbackHandler):
+            def __init__(self):
+                self._started = {}
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                self._started[run_id] = time.perf_counter()
+
+            def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+                self._started[run_id] = time.perf_counter()
+
+            def on_llm_new_token(self, token, *, run_id, **kwargs):
+                start = self._started.pop(run_id, None)
+                if start is not None:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, model=model)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                start = self._started.pop(run_id, None)
+                if start is not None:
+                    # Not streamed: the first token arrived with the whole response
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, model=model)
+                for generations in response.generations:
+                    for generation in generations:
+                        usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                        if usage.get("input_tokens"):
+                            LLM_TOKENS.inc(usage["input_tokens"], model=model, direction="input")
+                        if usage.get("output_tokens"):
+                            LLM_TOKENS.inc(usage["output_tokens"], model=model, direction="output")
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._started.pop(run_id, None)
+
+        _llm_callbacks[model] = [LLMUsageCallback()]
+    return _llm_callbacks[model]
@@ -0,0 +1,83 @@
+import random
+import re
+import threading
+import time
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Only numbers that are clearly a status code count, e.g. "HTTP 503", "status code: 429",
+# or a leading "429 Resource has been exhausted" as google.api_core formats its errors
+STATUS_CODE_PATTERN = re.compile(
+    r"^\s*(\d{3})\b|\b(?:http(?:/\d(?:\.\d)?)?|status(?:[ _]code)?|error code)\s*[:=]?\s*(\d{3})\b",
+    re.IGNORECASE,
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; each call
+    to `acquire` takes one token and blocks until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def error_status_code(exc: Exception):
+    """Best-effort extraction of an HTTP status code from an SDK exception."""
+    for attr in ("status_code", "code", "http_status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    if isinstance(value, int):
+        return value
+    match = STATUS_CODE_PATTERN.search(str(exc))
+    return int(match.group(1) or match.group(2)) if match else None
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """True for rate-limit (429) and server-side (5xx) failures."""
+    status = error_status_code(exc)
+    if status in RETRYABLE_STATUS_CODES:
+        return True
+    message = str(exc).lower()
+    return "resource has been exhausted" in message or "rate limit" in message
+
+
+def retry_with_backoff(fn, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                       is_retryable=is_retryable_error):
+    """
+    Calls `fn()` and retries retryable failures with exponential backoff and jitter.
+    Non-retryable errors, and the last retryable one, are re-raised.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
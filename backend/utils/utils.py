@@ -1,5 +1,5 @@
 import os
-from supabase import create_client, Client
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,27 +8,49 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-def download_supabase_images(folder_path):
+# Clients are created on first use so importing this module stays cheap
+_supabase = None
+_download_manager = None
+_client_lock = threading.Lock()
+
+def get_supabase():
+    """Returns the shared Supabase client, creating it on first use."""
+    global _supabase
+    with _client_lock:
+        if _supabase is None:
+            from supabase import create_client
+            _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
+
+def get_download_manager():
+    """Returns the shared DownloadManager for the Supabase bucket."""
+    global _download_manager
+    supabase = get_supabase()
+    with _client_lock:
+        if _download_manager is None:
+            from utils.download_manager import DownloadManager, SupabaseStorage
+            _download_manager = DownloadManager(SupabaseStorage(supabase, SUPABASE_URL, SUPABASE_KEY, BUCKET_NAME))
+    return _download_manager
+
+def local_folder_for(folder_path):
     subfolder_name = folder_path.strip("/").split("/")[-1]
-    local_dir = os.path.join(ROOT_DIR, "downloaded", subfolder_name)
+    return os.path.join(ROOT_DIR, "downloaded", subfolder_name)
 
-    os.makedirs(local_dir, exist_ok=True)
+def stream_supabase_images(folder_path):
+    """
+    Starts downloading a folder and returns (local_dir, paths), where `paths`
+    yields each local file path as soon as it has been written.
+    """
+    local_dir = local_folder_for(folder_path)
+    return local_dir, get_download_manager().iter_downloads(folder_path.rstrip("/"), local_dir)
 
-    files = supabase.storage.from_(BUCKET_NAME).list(path=folder_path)
-
-    for file_info in files:
-        file_name = file_info["name"]
-        file_path = f"{folder_path}/{file_name}"
-        local_file_path = os.path.join(local_dir, file_name)
+def download_supabase_images(folder_path):
+    local_dir = local_folder_for(folder_path)
 
-        print(f"Downloading {file_path} → {local_file_path}")
-        res = supabase.storage.from_(BUCKET_NAME).download(file_path)
-        with open(local_file_path, "wb") as f:
-            f.write(res)
+    print(f"Downloading {folder_path} → {local_dir}")
+    run = get_download_manager().download(folder_path.rstrip("/"), local_dir)
 
-    print(f"Download complete. in {local_dir}")
-    return local_dir
\ No newline at end of file
+    print(f"Download complete. in {local_dir}: {run.metrics}")
+    return local_dir
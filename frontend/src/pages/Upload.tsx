@@ -125,7 +125,21 @@ const Upload = () => {
         });
 
         if (response.ok) {
-          apiResponse = await response.json();
+          const { job_id } = await response.json();
+
+          // The analysis runs as a background job; poll until it finishes
+          while (job_id) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const jobResponse = await fetch(`http://34.93.86.68:8060/jobs/${job_id}`);
+            if (!jobResponse.ok) break;
+
+            const job = await jobResponse.json();
+            if (job.status === 'completed') {
+              apiResponse = job.result;
+              break;
+            }
+            if (job.status === 'failed') break;
+          }
         }
       } catch (apiError) {
         console.log('API call failed, using dummy data');